@@ -1,31 +1,96 @@
-from backend.preprocess import preprocess_documents
-from backend.embeddings import generate_embeddings
-from backend.rag import AgroDocRAG
+from typing import Dict
+from pathlib import Path
+import hashlib
 import logging
+import json
+import time
+import os
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def initialize_chromadb():
-    """Initialize ChromaDB with sample document to generate Parquet files."""
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _load_manifest(path: str) -> Dict:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+
+def _save_manifest(manifest: Dict, path: str) -> None:
+    # Write then rename so an interrupted load never leaves a truncated manifest
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def initialize_chromadb(raw_dir: str = 'data/raw', manifest_path: str = 'data/processed/ingest_manifest.json') -> Dict:
+    """Bulk-load every document under raw_dir into ChromaDB, resuming from the manifest.
+
+    Files whose content hash matches a completed manifest entry are skipped,
+    chunks already in the collection are not re-embedded, and chunks of
+    changed or removed files are deleted. Files that fail to parse keep their
+    stored chunks and are marked failed, so the next run retries them.
+    """
+    # Imported here so importing the backend package (e.g. for the API) stays cheap
+    from backend.ingest import ingest_documents
+    from backend.uploads import SUPPORTED_EXTENSIONS
+    from backend.rag import AgroDocRAG
     try:
-        # Read sample document
-        with open('data/raw/sample_doc.txt', 'r') as f:
-            documents = [f.read()]
-        
-        # Preprocess and generate embeddings
-        processed_docs = preprocess_documents(documents)
-        embeddings, texts, metadatas = generate_embeddings(processed_docs, [{"source": "sample_doc.txt"}])
-        
-        # Store in ChromaDB
         rag = AgroDocRAG()
-        rag.store_documents(texts, embeddings, metadatas)
-        
-        logger.info("Initialized ChromaDB and generated Parquet files in data/processed/")
+        manifest = _load_manifest(manifest_path)
+        files = manifest["files"]
+        seen_sources = set()
+
+        for root, _, names in os.walk(raw_dir):
+            for name in sorted(names):
+                if not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                source = os.path.relpath(path, raw_dir).replace(os.sep, '/')
+                seen_sources.add(source)
+                digest = _file_digest(path)
+                entry = files.get(source)
+                if entry and entry["sha256"] == digest and entry["status"] == "done":
+                    continue
+
+                files[source] = {"sha256": digest, "status": "in_progress", "started_at": time.time()}
+                _save_manifest(manifest, manifest_path)
+
+                # Paths are read by the ingest pipeline, which decodes text files leniently
+                document = Path(path)
+                chunk_ids = set()
+                stats = ingest_documents([document], [{"source": source}], rag, seen_ids=chunk_ids)
+                if stats.get("errors"):
+                    # chunk_ids is partial, so keep the chunks already stored and retry the file next run
+                    files[source].update(status="failed", errors=stats["errors"], finished_at=time.time())
+                    _save_manifest(manifest, manifest_path)
+                    logger.error(f"Failed to load {source}: {'; '.join(stats['errors'])}")
+                    continue
+                rag.delete_stale(source, chunk_ids)
+
+                files[source].update(status="done", chunks=len(chunk_ids), new_chunks=stats["stored"], finished_at=time.time())
+                _save_manifest(manifest, manifest_path)
+                logger.info(f"Loaded {source}: {stats['stored']} new of {len(chunk_ids)} chunks")
+
+        # Files removed from raw_dir no longer contribute chunks
+        for source in [source for source in files if source not in seen_sources]:
+            rag.delete_stale(source, set())
+            del files[source]
+        _save_manifest(manifest, manifest_path)
+
+        logger.info(f"Initialized ChromaDB from {raw_dir} into data/processed/")
+        return manifest
     except Exception as e:
         logger.error(f"Error initializing ChromaDB: {str(e)}")
         raise
 
 if __name__ == "__main__":
-    initialize_chromadb()
\ No newline at end of file
+    initialize_chromadb()
@@ -0,0 +1,33 @@
+from typing import Tuple
+import threading
+import time
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = 8, queue_timeout: float = 2.0):
+        """Bound the requests a worker processes at once; others wait briefly, then are turned away."""
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+
+    def acquire(self) -> Tuple[bool, float]:
+        """Wait up to queue_timeout for a slot; return whether one was granted and the seconds waited."""
+        start = time.perf_counter()
+        admitted = False
+        with self._lock:
+            self.waiting += 1
+        try:
+            admitted = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                if admitted:
+                    self.in_flight += 1
+        return admitted, time.perf_counter() - start
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
@@ -0,0 +1,172 @@
+import numpy as np
+import sqlite3
+import threading
+import logging
+import time
+import os
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class AnswerCache:
+    def __init__(self, path: str = "data/processed/answer_cache.sqlite3", max_entries: int = 5000,
+                 ttl_seconds: float = 604800, similarity_threshold: float = 0.95, touch_interval: float = 300):
+        """SQLite-backed answer cache shared by every worker using the same data directory."""
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        # last_used only orders eviction, so a hit rewrites it at most once per touch_interval
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                query_key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                embedding BLOB,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        # In-memory copy of the stored embeddings for similarity search, reloaded
+        # whenever this or another process changes the table
+        self._keys = []
+        self._matrix = None
+        self._created = None
+        self._data_version = None
+        self._dirty = True
+
+    def _expired_before(self) -> float:
+        return time.time() - self.ttl_seconds
+
+    def _refresh_index(self) -> None:
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if not self._dirty and data_version == self._data_version:
+            return
+        rows = self._conn.execute(
+            "SELECT query_key, embedding, created_at FROM answers WHERE embedding IS NOT NULL"
+        ).fetchall()
+        self._keys = [row[0] for row in rows]
+        self._matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else None
+        self._created = np.array([row[2] for row in rows], dtype=np.float64)
+        self._data_version = data_version
+        self._dirty = False
+
+    def _update_index(self, query_key: str, vector: Optional[np.ndarray], created_at: float, removed: List[str]) -> None:
+        # Apply this process's own write to the in-memory index instead of reloading every row;
+        # a full reload is still needed if another process changed the table since the last one
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._dirty or data_version != self._data_version:
+            self._dirty = True
+            return
+        dropped = set(removed)
+        dropped.add(query_key)
+        keep = [i for i, key in enumerate(self._keys) if key not in dropped]
+        self._keys = [self._keys[i] for i in keep]
+        self._matrix = self._matrix[keep] if self._matrix is not None and keep else None
+        self._created = self._created[keep] if keep else np.array([], dtype=np.float64)
+        if vector is not None and query_key not in removed:
+            self._keys.append(query_key)
+            self._matrix = vector[None, :] if self._matrix is None else np.vstack([self._matrix, vector])
+            self._created = np.append(self._created, created_at)
+
+    def _fetch(self, query_key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT answer, last_used FROM answers WHERE query_key = ? AND created_at > ?",
+            (query_key, self._expired_before())
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] >= self.touch_interval:
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE query_key = ?", (now, query_key))
+            self._conn.commit()
+        return row[0]
+
+    def lookup(self, query_key: str, embedding: List[float] = None) -> Optional[Dict]:
+        """Return a cached answer for the query, or for a stored query similar enough to it."""
+        try:
+            with self._lock:
+                answer = self._fetch(query_key)
+                if answer is not None:
+                    self.hits += 1
+                    return {"answer": answer, "query_key": query_key, "similarity": 1.0}
+
+                if embedding is not None and self.similarity_threshold <= 1.0:
+                    self._refresh_index()
+                    if self._matrix is not None:
+                        vector = _normalize(np.asarray(embedding, dtype=np.float32))
+                        similarities = self._matrix @ vector
+                        similarities[self._created <= self._expired_before()] = -1.0
+                        best = int(np.argmax(similarities))
+                        if similarities[best] >= self.similarity_threshold:
+                            answer = self._fetch(self._keys[best])
+                            if answer is not None:
+                                self.hits += 1
+                                self.semantic_hits += 1
+                                return {"answer": answer, "query_key": self._keys[best], "similarity": float(similarities[best])}
+                self.misses += 1
+                return None
+        except Exception as e:
+            logger.error(f"Error reading answer cache: {str(e)}")
+            return None
+
+    def store(self, query_key: str, query: str, answer: str, embedding: List[float] = None) -> None:
+        """Store an answer and prune expired or excess entries."""
+        try:
+            vector = _normalize(np.asarray(embedding, dtype=np.float32)) if embedding is not None else None
+            blob = vector.tobytes() if vector is not None else None
+            now = time.time()
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers (query_key, query, embedding, answer, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (query_key, query, blob, answer, now, now)
+                )
+                # Expired and excess entries are looked up first so the in-memory index can drop them too
+                removed = [row[0] for row in self._conn.execute(
+                    "SELECT query_key FROM answers WHERE created_at <= ?", (self._expired_before(),)
+                )]
+                removed += [row[0] for row in self._conn.execute(
+                    "SELECT query_key FROM answers WHERE created_at > ? ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                    (self._expired_before(), self.max_entries)
+                )]
+                self._conn.executemany("DELETE FROM answers WHERE query_key = ?", [(key,) for key in removed])
+                self._conn.commit()
+                self._update_index(query_key, vector, now, removed)
+        except Exception as e:
+            logger.error(f"Error writing answer cache: {str(e)}")
+
+    def invalidate(self) -> None:
+        """Drop every cached answer, e.g. after the document collection changed."""
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM answers")
+                self._conn.commit()
+                self._dirty = True
+            logger.info("Invalidated answer cache")
+        except Exception as e:
+            logger.error(f"Error invalidating answer cache: {str(e)}")
+
+    def stats(self) -> Dict:
+        """Return entry count and hit/miss counters."""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            return {
+                "size": size,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses
+            }
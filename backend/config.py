@@ -0,0 +1,23 @@
+import yaml
+import os
+import logging
+from functools import lru_cache
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Try different paths for config file
+CONFIG_PATHS = ['config/config.yaml', '../config/config.yaml', os.path.join(os.path.dirname(__file__), '../config/config.yaml')]
+
+@lru_cache(maxsize=1)
+def load_config() -> Dict:
+    """Load config/config.yaml once per process."""
+    for path in CONFIG_PATHS:
+        try:
+            with open(path, 'r') as f:
+                config = yaml.safe_load(f)
+            logger.info(f"Loaded configuration from {path}")
+            return config
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError("Could not find config/config.yaml")
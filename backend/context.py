@@ -0,0 +1,120 @@
+from backend import metrics
+from typing import Dict, List
+import numpy as np
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count, about four characters per token."""
+    return (len(text) + 3) // 4
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _overlap(a: str, b: str, min_overlap: int) -> int:
+    """Length of the longest suffix of a that is also a prefix of b, if at least min_overlap."""
+    if len(b) < min_overlap:
+        return 0
+    probe = b[:min_overlap]
+    pos = a.find(probe, max(0, len(a) - len(b)))
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    return 0
+
+def _merge_pair(a: Dict, b: Dict, min_overlap: int) -> Dict:
+    # Chunks split with chunk_overlap share a span: "...xyz" + "xyz..." -> "...xyz..."
+    if b["text"] in a["text"]:
+        text = a["text"]
+    elif a["text"] in b["text"]:
+        text = b["text"]
+    else:
+        overlap = _overlap(a["text"], b["text"], min_overlap)
+        if overlap:
+            text = a["text"] + b["text"][overlap:]
+        else:
+            overlap = _overlap(b["text"], a["text"], min_overlap)
+            if not overlap:
+                return None
+            text = b["text"] + a["text"][overlap:]
+    return {
+        "text": text,
+        "metadata": a["metadata"] if a["relevance"] >= b["relevance"] else b["metadata"],
+        "embedding": _unit(a["embedding"] + b["embedding"]),
+        "relevance": max(a["relevance"], b["relevance"])
+    }
+
+def merge_overlapping(units: List[Dict], min_overlap: int = 50) -> List[Dict]:
+    """Merge chunks of the same source and page whose texts overlap or contain one another."""
+    merged = []
+    groups = {}
+    for unit in units:
+        meta = unit["metadata"] or {}
+        groups.setdefault((meta.get("source"), meta.get("page")), []).append(unit)
+    for group in groups.values():
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(group)):
+                for j in range(i + 1, len(group)):
+                    combined = _merge_pair(group[i], group[j], min_overlap)
+                    if combined is not None:
+                        group = [unit for k, unit in enumerate(group) if k not in (i, j)] + [combined]
+                        changed = True
+                        break
+                if changed:
+                    break
+        merged.extend(group)
+    return merged
+
+def _truncate(text: str, tokens: int) -> str:
+    cut = text[:tokens * 4]
+    # Prefer ending on a word boundary
+    return cut.rsplit(" ", 1)[0] if " " in cut[len(cut) // 2:] else cut
+
+def pack_context(query_embedding: List[float], items: List[Dict], token_budget: int = 800, max_chunks: int = 5,
+                 mmr_lambda: float = 0.7, dedup_threshold: float = 0.95, min_overlap: int = 50) -> List[Dict]:
+    """Turn retrieved chunks (each with an "embedding") into a compact prompt context.
+
+    Overlapping chunks of the same source and page are merged, then chunks are
+    picked by maximal marginal relevance: near-duplicates of an already picked
+    chunk are dropped, and picking stops at max_chunks or once token_budget is
+    used up.
+    """
+    if not items:
+        return []
+    query = _unit(query_embedding)
+    units = []
+    for item in items:
+        embedding = _unit(item["embedding"])
+        units.append({"text": item["text"], "metadata": item["metadata"], "embedding": embedding,
+                      "relevance": float(embedding @ query)})
+    candidates = merge_overlapping(units, min_overlap)
+
+    selected = []
+    remaining = token_budget
+    while candidates and remaining > 0 and len(selected) < max_chunks:
+        redundancy = [
+            max((float(candidate["embedding"] @ chosen["embedding"]) for chosen in selected), default=0.0)
+            for candidate in candidates
+        ]
+        scores = [mmr_lambda * candidate["relevance"] - (1 - mmr_lambda) * similarity
+                  for candidate, similarity in zip(candidates, redundancy)]
+        best = int(np.argmax(scores))
+        candidate = candidates.pop(best)
+        if redundancy[best] >= dedup_threshold:
+            continue
+        tokens = estimate_tokens(candidate["text"])
+        if tokens > remaining:
+            if selected:
+                continue
+            # The single most relevant chunk is always kept, cut to the budget
+            candidate["text"] = _truncate(candidate["text"], remaining)
+            tokens = remaining
+        selected.append(candidate)
+        remaining -= tokens
+
+    metrics.CONTEXT_TOKENS.inc("retrieved", amount=sum(estimate_tokens(item["text"]) for item in items))
+    metrics.CONTEXT_TOKENS.inc("packed", amount=token_budget - remaining)
+    return [{"text": unit["text"], "metadata": unit["metadata"]} for unit in selected]
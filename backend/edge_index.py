@@ -0,0 +1,288 @@
+"""Compact, memory-mapped vector index for offline retrieval without ChromaDB.
+
+Export a collection with
+
+    python -m backend.edge_index export --path data/edge_index --dtype int8
+
+and set `retrieval.backend: edge` in config/config.yaml to search it instead.
+"""
+from backend.partitions import FILTER_FIELDS
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+import argparse
+import threading
+import logging
+import shutil
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+SUPPORTED_DTYPES = ("int8", "float16")
+BLOCK_ROWS = 32768
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    # int8 keeps one float32 scale per row so each row uses the full [-127, 127] range
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+def _dequantize(vectors: np.ndarray, scales: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    dequantized = np.asarray(vectors[rows], dtype=np.float32)
+    return dequantized * scales[rows][:, None] if scales is not None else dequantized
+
+def _iter_collection(collection, batch_size: int) -> Iterator[Dict]:
+    for offset in range(0, collection.count(), batch_size):
+        yield collection.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit vectors; returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = vectors[assignment == i]
+            # Re-seed empty lists from a random vector rather than dropping them
+            centroids[i] = members.sum(axis=0) if len(members) else vectors[rng.integers(len(vectors))]
+        centroids = _normalize_rows(centroids)
+    return centroids.astype(np.float32)
+
+def export_edge_index(collection, path: str = "data/edge_index", dtype: str = "int8", ivf_lists: int = 0,
+                      batch_size: int = 1024, model_name: str = None) -> Dict:
+    """Write the collection's embeddings, texts and metadata as a quantized, memory-mappable index.
+
+    With ivf_lists > 0 the rows are also clustered into that many inverted lists,
+    so a search only scores the lists nearest to the query.
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported dtype {dtype}, expected one of {SUPPORTED_DTYPES}")
+    start = time.perf_counter()
+    count = collection.count()
+    if not count:
+        raise ValueError("Collection is empty, nothing to export")
+    # Build next to the target and swap it in at the end, so readers never see a partial index
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    vectors = scales = None
+    offsets = np.zeros(count, dtype=np.int64)
+    # Filterable metadata is kept as one small integer code per row and field
+    vocabularies = {field: {} for field in FILTER_FIELDS}
+    codes = {field: np.zeros(count, dtype=np.int32) for field in FILTER_FIELDS}
+    row = 0
+    with open(os.path.join(tmp_path, "texts.jsonl"), "wb") as texts:
+        for batch in _iter_collection(collection, batch_size):
+            embeddings = _normalize_rows(np.asarray(batch["embeddings"], dtype=np.float32))
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(tmp_path, "vectors.npy"), mode="w+", dtype=dtype, shape=(count, embeddings.shape[1])
+                )
+                if dtype == "int8":
+                    scales = np.lib.format.open_memmap(
+                        os.path.join(tmp_path, "scales.npy"), mode="w+", dtype=np.float32, shape=(count,)
+                    )
+            quantized, batch_scales = _quantize(embeddings, dtype)
+            vectors[row:row + len(quantized)] = quantized
+            if scales is not None:
+                scales[row:row + len(quantized)] = batch_scales
+            for doc_id, text, meta in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                offsets[row] = texts.tell()
+                for field, vocabulary in vocabularies.items():
+                    value = str((meta or {}).get(field, ""))
+                    codes[field][row] = vocabulary.setdefault(value, len(vocabulary))
+                texts.write(json.dumps({"id": doc_id, "text": text, "metadata": meta or {}}, ensure_ascii=False).encode("utf-8") + b"\n")
+                row += 1
+    # The collection may have shrunk while exporting
+    count = row
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets[:count])
+    for field in FILTER_FIELDS:
+        np.save(os.path.join(tmp_path, f"field_{field}.npy"), codes[field][:count])
+
+    info = {"version": INDEX_VERSION, "dtype": dtype, "count": count, "dim": int(vectors.shape[1]),
+            "model": model_name, "ivf_lists": 0, "created_at": time.time(),
+            "fields": {field: sorted(vocabulary, key=vocabulary.get) for field, vocabulary in vocabularies.items()}}
+    if ivf_lists:
+        ivf_lists = min(ivf_lists, count)
+        # Train on a sample of the quantized rows, then assign every row block by block
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(count, min(count, ivf_lists * 256), replace=False))
+        centroids = _kmeans(_normalize_rows(_dequantize(vectors, scales, sample)), ivf_lists)
+        assignment = np.concatenate([
+            np.argmax(_dequantize(vectors, scales, np.arange(i, min(i + BLOCK_ROWS, count))) @ centroids.T, axis=1)
+            for i in range(0, count, BLOCK_ROWS)
+        ])
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.searchsorted(assignment[order], np.arange(ivf_lists + 1)).astype(np.int64)
+        np.save(os.path.join(tmp_path, "centroids.npy"), centroids)
+        np.save(os.path.join(tmp_path, "ivf_rows.npy"), order)
+        np.save(os.path.join(tmp_path, "ivf_offsets.npy"), list_offsets)
+        info["ivf_lists"] = ivf_lists
+    vectors.flush()
+    if scales is not None:
+        scales.flush()
+    del vectors, scales
+
+    with open(os.path.join(tmp_path, "index.json"), "w") as f:
+        json.dump(info, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    info["seconds"] = time.perf_counter() - start
+    logger.info(f"Exported {count} vectors as {dtype} to {path} in {info['seconds']:.2f}s")
+    return info
+
+class EdgeIndex:
+    def __init__(self, path: str = "data/edge_index", nprobe: int = 8):
+        """Read-only index written by export_edge_index, searched by cosine similarity.
+
+        Arrays are memory-mapped, so opening is near-instant and only the pages a
+        search touches are read into memory.
+        """
+        with open(os.path.join(path, "index.json"), "r") as f:
+            self.info = json.load(f)
+        if self.info.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported edge index version {self.info.get('version')} in {path}")
+        self.path = path
+        self.nprobe = nprobe
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if self.info["dtype"] == "int8" else None
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.field_codes = {
+            field: np.load(os.path.join(path, f"field_{field}.npy"), mmap_mode="r")
+            for field in self.info.get("fields", {})
+        }
+        self.centroids = None
+        if self.info.get("ivf_lists"):
+            self.centroids = np.load(os.path.join(path, "centroids.npy"))
+            self.ivf_rows = np.load(os.path.join(path, "ivf_rows.npy"), mmap_mode="r")
+            self.ivf_offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+        self._texts = open(os.path.join(path, "texts.jsonl"), "rb")
+        self._texts_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.info["count"]
+
+    def _score(self, rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        # Scale the dot products rather than the rows: one multiply per score instead of per dimension
+        scores = np.asarray(self.vectors[rows], dtype=np.float32) @ queries.T
+        return scores * self.scales[rows][:, None] if self.scales is not None else scores
+
+    def _blocks(self, rows: np.ndarray = None) -> Iterator[np.ndarray]:
+        if rows is None:
+            for i in range(0, len(self), BLOCK_ROWS):
+                yield np.arange(i, min(i + BLOCK_ROWS, len(self)))
+        else:
+            for i in range(0, len(rows), BLOCK_ROWS):
+                yield rows[i:i + BLOCK_ROWS]
+
+    def _where_mask(self, where: Dict) -> np.ndarray:
+        """Rows matching a ChromaDB-style where clause using $and, $or, $in, $eq or plain equality."""
+        masks = []
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                sub_masks = [self._where_mask(clause) for clause in condition]
+                masks.append(np.logical_and.reduce(sub_masks) if key == "$and" else np.logical_or.reduce(sub_masks))
+                continue
+            if isinstance(condition, dict):
+                if set(condition) - {"$in", "$eq"}:
+                    raise ValueError(f"Unsupported edge index filter on {key}: {condition}")
+                values = condition.get("$in", []) + ([condition["$eq"]] if "$eq" in condition else [])
+            else:
+                values = [condition]
+            if key not in self.field_codes:
+                # Fields that were not exported match nothing, as missing metadata does in ChromaDB
+                masks.append(np.zeros(len(self), dtype=bool))
+                continue
+            vocabulary = self.info["fields"][key]
+            wanted = [vocabulary.index(str(value)) for value in values if str(value) in vocabulary]
+            masks.append(np.isin(self.field_codes[key], wanted))
+        return np.logical_and.reduce(masks) if masks else np.ones(len(self), dtype=bool)
+
+    def _probe_rows(self, query: np.ndarray) -> np.ndarray:
+        lists = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        rows = np.concatenate([self.ivf_rows[self.ivf_offsets[i]:self.ivf_offsets[i + 1]] for i in lists])
+        # Sorted rows keep memory-mapped reads sequential
+        rows.sort()
+        return rows
+
+    def _top_k(self, blocks: Iterator[np.ndarray], queries: np.ndarray, top_k: int) -> List[List[int]]:
+        """Best rows per query, best first, keeping at most top_k candidates between blocks."""
+        best_rows = [np.empty(0, dtype=np.int64) for _ in queries]
+        best_scores = [np.empty(0, dtype=np.float32) for _ in queries]
+        for rows in blocks:
+            scores = self._score(rows, queries)
+            for q in range(len(queries)):
+                candidate_rows = np.concatenate([best_rows[q], rows])
+                candidate_scores = np.concatenate([best_scores[q], scores[:, q]])
+                if len(candidate_rows) > top_k:
+                    keep = np.argpartition(-candidate_scores, top_k)[:top_k]
+                    candidate_rows, candidate_scores = candidate_rows[keep], candidate_scores[keep]
+                best_rows[q], best_scores[q] = candidate_rows, candidate_scores
+        return [[int(r) for r in rows[np.argsort(-scores)]] for rows, scores in zip(best_rows, best_scores)]
+
+    def _read_rows(self, rows: List[int]) -> List[Dict]:
+        items = []
+        with self._texts_lock:
+            for row in rows:
+                self._texts.seek(int(self.offsets[row]))
+                items.append(json.loads(self._texts.readline()))
+        return items
+
+    def search(self, query_embeddings: List[List[float]], top_k: int = 5, with_embeddings: bool = False,
+               where: Dict = None) -> List[List[Dict]]:
+        """Return the top_k chunks per query as {"text", "metadata"} dicts, best first.
+
+        where restricts the search to rows whose crop, region, category or source
+        match, as in ChromaDB. With with_embeddings each chunk also carries its
+        dequantized "embedding".
+        """
+        queries = _normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        mask = self._where_mask(where) if where else None
+        if self.centroids is None:
+            # One pass over the index scores every query
+            hits = self._top_k(self._blocks(np.flatnonzero(mask) if mask is not None else None), queries, top_k)
+        else:
+            hits = []
+            for query in queries:
+                rows = self._probe_rows(query)
+                hits.append(self._top_k(self._blocks(rows[mask[rows]] if mask is not None else rows), query[None, :], top_k)[0])
+        results = []
+        for rows in hits:
+            items = [{"text": item["text"], "metadata": item["metadata"]} for item in self._read_rows(rows)]
+            if with_embeddings and rows:
+                for item, embedding in zip(items, _dequantize(self.vectors, self.scales, np.asarray(rows))):
+                    item["embedding"] = embedding
+            results.append(items)
+        return results
+
+    def close(self) -> None:
+        self._texts.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export the ChromaDB collection as a compact edge index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="write data/processed's collection as a quantized index")
+    export.add_argument("--path", default="data/edge_index", help="output directory (default: data/edge_index)")
+    export.add_argument("--dtype", choices=SUPPORTED_DTYPES, default="int8")
+    export.add_argument("--ivf-lists", type=int, default=0, help="number of IVF lists; 0 for brute-force search")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    import chromadb
+    from backend.config import load_config
+    collection = chromadb.PersistentClient(path="data/processed").get_or_create_collection("agri_docs")
+    info = export_edge_index(collection, args.path, args.dtype, args.ivf_lists, model_name=load_config().get("embedding_model"))
+    print(json.dumps(info, indent=2))
+
+if __name__ == "__main__":
+    main()
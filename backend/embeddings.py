@@ -1,39 +1,108 @@
-from chromadb.utils import embedding_functions
-from langchain.docstore.document import Document
-from typing import List, Dict, Tuple
-import yaml
+from backend.config import load_config
+from backend import metrics
+from typing import TYPE_CHECKING, List, Dict, Tuple
+import threading
 import logging
-import os
+import time
+
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+    from sentence_transformers import SentenceTransformer
 
 logger = logging.getLogger(__name__)
 
-def generate_embeddings(documents: List[Document], metadata: List[Dict]) -> Tuple[List, List, List]:
+class EmbeddingEngine:
+    def __init__(self, model_name: str, batch_size: int = 32):
+        """Sentence-transformer encoder that loads its weights once and encodes in batches."""
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.load_seconds = None
+        self.batches = 0
+        self.texts_encoded = 0
+        self.encode_seconds = 0.0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self) -> "SentenceTransformer":
+        """Load the model weights on first use and return the model."""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    # Imported here: sentence_transformers pulls in torch, which alone takes seconds
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                    self.load_seconds = time.perf_counter() - start
+                    logger.info(f"Loaded embedding model {self.model_name} in {self.load_seconds:.2f}s")
+        return self._model
+
+    def encode(self, texts: List[str], batch_size: int = None) -> List[List[float]]:
+        """Encode texts in batches of `batch_size` and return one embedding per text."""
+        model = self.load()
+        batch_size = batch_size or self.batch_size
+        embeddings = []
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
+            start = time.perf_counter()
+            vectors = model.encode(batch, batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False)
+            elapsed = time.perf_counter() - start
+            embeddings.extend(vectors.tolist())
+            with self._stats_lock:
+                self.batches += 1
+                self.texts_encoded += len(batch)
+                self.encode_seconds += elapsed
+                self.last_batch_size = len(batch)
+                self.last_batch_seconds = elapsed
+        return embeddings
+
+    def stats(self) -> Dict:
+        """Return load time and encoding throughput counters."""
+        with self._stats_lock:
+            return {
+                "model_name": self.model_name,
+                "loaded": self.loaded,
+                "load_seconds": self.load_seconds,
+                "batch_size": self.batch_size,
+                "batches": self.batches,
+                "texts_encoded": self.texts_encoded,
+                "encode_seconds": self.encode_seconds,
+                "texts_per_second": self.texts_encoded / self.encode_seconds if self.encode_seconds else 0.0,
+                "last_batch_texts_per_second": self.last_batch_size / self.last_batch_seconds if self.last_batch_seconds else 0.0
+            }
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_embedding_engine() -> EmbeddingEngine:
+    """Return the process-wide embedding engine, creating it from config on first call."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                config = load_config()
+                _engine = EmbeddingEngine(
+                    model_name=config["embedding_model"],
+                    batch_size=config.get("embedding_batch_size", 32)
+                )
+    return _engine
+
+def generate_embeddings(documents: List["Document"], metadata: List[Dict]) -> Tuple[List, List, List]:
     """Generate embeddings for document chunks."""
     try:
-        # Try different paths for config file
-        config_paths = ['config/config.yaml', '../config/config.yaml', os.path.join(os.path.dirname(__file__), '../config/config.yaml')]
-        config = None
-        
-        for path in config_paths:
-            try:
-                with open(path, 'r') as f:
-                    config = yaml.safe_load(f)
-                    break
-            except FileNotFoundError:
-                continue
-                
-        if not config:
-            raise FileNotFoundError("Could not find config/config.yaml")
-        
-        embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=config["embedding_model"]
-        )
         texts = [doc.page_content for doc in documents]
-        embeddings = embedding_function(texts)
+        with metrics.timed("ingest_embed"):
+            embeddings = get_embedding_engine().encode(texts)
         metadatas = [meta if meta else {} for meta in metadata[:len(documents)]]
-        
+
         logger.info(f"Generated embeddings for {len(texts)} document chunks")
         return embeddings, texts, metadatas
     except Exception as e:
         logger.error(f"Error generating embeddings: {str(e)}")
-        raise
\ No newline at end of file
+        raise
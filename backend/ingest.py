@@ -0,0 +1,71 @@
+from backend.preprocess import iter_document_chunks, iter_batches
+from backend.embeddings import generate_embeddings
+from backend.config import load_config
+from backend.rag import chunk_id
+from backend.partitions import PARTITION_FIELDS, get_tagger
+from backend import metrics
+from typing import List, Dict, Set
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def ingest_documents(documents: List, metadata: List[Dict], rag, batch_size: int = None, seen_ids: Set[str] = None,
+                     stats: Dict = None) -> Dict:
+    """Stream document chunks through embedding and storage in fixed-size batches.
+
+    Chunks whose content-addressed id is already in the collection are skipped
+    before embedding. Every chunk id produced is added to seen_ids if given, and
+    progress counters are updated in place in stats if given. New chunks are
+    tagged with crop, region and category metadata for filtered retrieval, as
+    are stored chunks that were saved without it.
+    """
+    ingest_config = load_config().get("ingest", {})
+    batch_size = batch_size or ingest_config.get("batch_size", 64)
+    stats = stats if stats is not None else {}
+    for key in ("pages", "chunks", "stored", "skipped"):
+        stats.setdefault(key, 0)
+    start = time.perf_counter()
+    try:
+        chunks = iter_document_chunks(
+            documents,
+            metadata,
+            chunk_size=ingest_config.get("chunk_size", 1000),
+            chunk_overlap=ingest_config.get("chunk_overlap", 200),
+            workers=ingest_config.get("workers", 1),
+            pages_per_task=ingest_config.get("pages_per_task", 8),
+            stats=stats
+        )
+        for batch in iter_batches(chunks, batch_size):
+            # Deduplicate within the batch, then drop chunks already stored
+            unique = {}
+            for doc in batch:
+                unique.setdefault(chunk_id(doc.page_content, doc.metadata.get("source", "")), doc)
+            if seen_ids is not None:
+                seen_ids.update(unique)
+            existing = rag.stored_metadatas(list(unique))
+            new_ids = [doc_id for doc_id in unique if doc_id not in existing]
+            stats["skipped"] += len(batch) - len(new_ids)
+            metrics.INGEST_CHUNKS.inc("skipped", amount=len(batch) - len(new_ids))
+            tagger = get_tagger()
+            # Chunks stored before partition tagging existed would be hidden by filtered queries
+            untagged = [doc_id for doc_id, meta in existing.items() if not all(meta.get(field) for field in PARTITION_FIELDS)]
+            rag.update_metadatas(untagged, [
+                tagger.tag(unique[doc_id].page_content, {**existing[doc_id], **unique[doc_id].metadata}) for doc_id in untagged
+            ])
+            if not new_ids:
+                continue
+            new_docs = [unique[doc_id] for doc_id in new_ids]
+            embeddings, texts, metadatas = generate_embeddings(
+                new_docs, [tagger.tag(doc.page_content, doc.metadata) for doc in new_docs]
+            )
+            with metrics.timed("ingest_store"):
+                rag.store_documents(texts, embeddings, metadatas, ids=new_ids)
+            stats["stored"] += len(texts)
+            metrics.INGEST_CHUNKS.inc("stored", amount=len(texts))
+        stats["seconds"] = time.perf_counter() - start
+        logger.info(f"Ingested {stats['pages']} pages into {stats['chunks']} chunks ({stats['stored']} new, {stats['skipped']} unchanged) in {stats['seconds']:.2f}s")
+        return stats
+    except Exception as e:
+        logger.error(f"Error ingesting documents: {str(e)}")
+        raise
@@ -0,0 +1,272 @@
+from backend.uploads import remove_uploads
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set
+import threading
+import sqlite3
+import logging
+import queue
+import json
+import time
+import uuid
+import os
+
+logger = logging.getLogger(__name__)
+
+class IngestJob:
+    def __init__(self, documents: List, metadata: List[Dict], uploads: List[str] = None):
+        """A queued ingest request and its progress; uploads are spooled files the job owns."""
+        self.id = uuid.uuid4().hex
+        self.documents = documents
+        self.metadata = metadata
+        self.uploads = uploads or []
+        self.document_count = len(documents)
+        self.status = "queued"
+        self.stats = {"pages": 0, "chunks": 0, "stored": 0, "skipped": 0}
+        self.errors = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self) -> Dict:
+        """Return a JSON-serializable progress report."""
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "documents": self.document_count,
+            "pages_done": self.stats.get("pages", 0),
+            "chunks_done": self.stats.get("chunks", 0),
+            "chunks_stored": self.stats.get("stored", 0),
+            "chunks_skipped": self.stats.get("skipped", 0),
+            "chunks_per_second": self.stats.get("chunks", 0) / elapsed if elapsed else 0.0,
+            "queued_seconds": (self.started_at or end) - self.created_at,
+            "elapsed_seconds": elapsed,
+            "errors": self.errors
+        }
+
+# Identifies this server process in the job store. PIDs are reused across container
+# restarts, so jobs are owned by an id no other process, before or after, will have
+INSTANCE_ID = uuid.uuid4().hex
+
+def _new_instance_id() -> None:
+    global INSTANCE_ID
+    INSTANCE_ID = uuid.uuid4().hex
+
+# Workers forked from a preloaded master must not share its id
+os.register_at_fork(after_in_child=_new_instance_id)
+
+class IngestJobStore:
+    def __init__(self, path: str = "data/processed/ingest_jobs.sqlite3", heartbeat_timeout: float = 60.0):
+        """SQLite record of ingest job progress, shared by every worker using the same data directory.
+
+        Jobs run in the worker process that accepted them; the store lets any
+        worker report their progress and bounds the number of queued jobs
+        across all workers. The owning process refreshes its unfinished jobs'
+        heartbeat; jobs of another process not refreshed for heartbeat_timeout
+        seconds are failed as orphans.
+        """
+        self.path = path
+        self.heartbeat_timeout = heartbeat_timeout
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This process's connection, opened on first use; a connection is never shared across fork."""
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    report TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    uploads TEXT NOT NULL DEFAULT '[]',
+                    instance TEXT NOT NULL DEFAULT ''
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "uploads" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN uploads TEXT NOT NULL DEFAULT '[]'")
+            if "instance" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN instance TEXT NOT NULL DEFAULT ''")
+            if "pid" in columns:
+                # Jobs are owned by instance now; PIDs repeat across restarts
+                self._conn.execute("ALTER TABLE jobs DROP COLUMN pid")
+            self._pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _fail_orphans(self) -> None:
+        # Jobs of a worker that exited (crash, timeout, restart) will never finish; nothing
+        # else will delete their spooled uploads either. Their owner stopped refreshing updated_at
+        rows = self.conn.execute(
+            "SELECT job_id, report, uploads FROM jobs WHERE status IN ('queued', 'running') "
+            "AND instance != ? AND updated_at < ?",
+            (INSTANCE_ID, time.time() - self.heartbeat_timeout)
+        ).fetchall()
+        for job_id, report, uploads in rows:
+            report = json.loads(report)
+            report["status"] = "failed"
+            report["errors"] = report.get("errors", []) + ["Ingest worker exited before the job finished"]
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', report = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(report), time.time(), job_id)
+            )
+            remove_uploads(json.loads(uploads))
+
+    def add(self, job: "IngestJob", max_depth: int) -> None:
+        """Record a new queued job; raises queue.Full when max_depth jobs are already queued."""
+        with self._transaction():
+            self._fail_orphans()
+            queued = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= max_depth:
+                raise queue.Full
+            self.conn.execute(
+                "INSERT INTO jobs (job_id, status, report, created_at, updated_at, uploads, instance) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, json.dumps(job.to_dict()), job.created_at, time.time(),
+                 json.dumps(job.uploads), INSTANCE_ID)
+            )
+
+    def save(self, job: "IngestJob") -> None:
+        """Write a job's current status and progress."""
+        try:
+            with self._lock:
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, report = ?, updated_at = ? WHERE job_id = ?",
+                    (job.status, json.dumps(job.to_dict()), time.time(), job.id)
+                )
+        except Exception as e:
+            logger.error(f"Error saving ingest job {job.id}: {str(e)}")
+
+    def heartbeat(self) -> None:
+        """Mark this process's queued and running jobs as still owned by a live process."""
+        try:
+            with self._lock:
+                self.conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE instance = ? AND status IN ('queued', 'running')",
+                    (time.time(), INSTANCE_ID)
+                )
+        except Exception as e:
+            logger.error(f"Error refreshing ingest job heartbeat: {str(e)}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return the latest progress report of a job, or None if it is unknown."""
+        with self._transaction():
+            self._fail_orphans()
+            row = self.conn.execute("SELECT report FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def active_uploads(self) -> Set[str]:
+        """Spooled uploads still owned by queued or running jobs of live workers."""
+        with self._transaction():
+            self._fail_orphans()
+            rows = self.conn.execute("SELECT uploads FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        return {path for row in rows for path in json.loads(row[0])}
+
+    def depth(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def prune(self, max_finished: int) -> None:
+        """Forget all but the max_finished most recent finished jobs."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN ('done', 'failed') "
+                "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (max_finished,)
+            )
+
+class IngestJobQueue:
+    def __init__(self, handler: Callable[[IngestJob], None], store: IngestJobStore, workers: int = 1, max_depth: int = 8,
+                 max_finished: int = 100, progress_interval: float = 1.0):
+        """Ingest jobs run by a pool of background worker threads, with progress kept in a shared store."""
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_finished = max_finished
+        self.progress_interval = progress_interval
+        self._queue = queue.Queue()
+        self._running = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._report_progress, name="ingest-progress", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, documents: List, metadata: List[Dict], uploads: List[str] = None) -> IngestJob:
+        """Enqueue a job; raises queue.Full when max_depth jobs are already waiting in any worker."""
+        job = IngestJob(documents, metadata, uploads)
+        with self._lock:
+            self._start()
+            self.store.add(job, self.max_depth)
+            self._queue.put_nowait(job)
+        self.store.prune(self.max_finished)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Progress report of a job accepted by any worker, or None if it is unknown."""
+        return self.store.get(job_id)
+
+    def depth(self) -> int:
+        return self.store.depth()
+
+    def _report_progress(self) -> None:
+        while True:
+            time.sleep(self.progress_interval)
+            with self._lock:
+                running = list(self._running.values())
+            for job in running:
+                self.store.save(job)
+            # Queued jobs have no progress to save but must not look orphaned either
+            self.store.heartbeat()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            with self._lock:
+                self._running[job.id] = job
+            self.store.save(job)
+            try:
+                self.handler(job)
+                job.status = "done"
+            except Exception as e:
+                logger.error(f"Error running ingest job {job.id}: {str(e)}")
+                job.errors.append(str(e))
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._running.pop(job.id, None)
+                # Release the payload; only the progress report is kept
+                job.documents = None
+                job.metadata = None
+                self.store.save(job)
+                self._queue.task_done()
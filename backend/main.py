@@ -1,10 +1,24 @@
-from flask import Flask, request, jsonify
-from backend.preprocess import preprocess_documents
-from backend.embeddings import generate_embeddings
+import time
+# Taken before the other imports so the logged start-up time includes them
+STARTED_AT = time.perf_counter()
+
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from backend import ingest, metrics
 from backend.rag import AgroDocRAG
+from backend.admission import AdmissionController
+from backend.config import load_config
+from backend.jobs import IngestJob, IngestJobQueue, IngestJobStore
+from backend.partitions import FILTER_FIELDS, validate_filters
+from backend.uploads import SUPPORTED_EXTENSIONS, SpoolingRequest, remove_uploads, spooled_path, sweep_uploads
 import os
+import json
+import queue
+import threading
+import base64
 import logging
-from typing import List, Dict
+from typing import List, Dict, Tuple
+from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -15,53 +29,256 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-rag = AgroDocRAG()
+# Multipart uploads are spooled to disk as they arrive instead of being held in memory
+uploads_config = load_config().get("uploads", {})
+SpoolingRequest.upload_dir = uploads_config.get("dir", "data/uploads")
+app.request_class = SpoolingRequest
+app.config["MAX_CONTENT_LENGTH"] = uploads_config.get("max_request_mb", 512) * 1024 * 1024
+_rag = None
+_rag_lock = threading.Lock()
+
+def get_rag() -> AgroDocRAG:
+    """Return the process-wide RAG pipeline, constructing it on first use."""
+    global _rag
+    if _rag is None:
+        with _rag_lock:
+            if _rag is None:
+                _rag = AgroDocRAG()
+    return _rag
+
+def is_ready() -> bool:
+    return _rag is not None and _rag.ready
+
+def warmup_in_background() -> threading.Thread:
+    """Warm the pipeline on a daemon thread so the server can accept liveness checks meanwhile."""
+    def run():
+        try:
+            get_rag().warmup()
+            logger.info(f"Backend ready {time.perf_counter() - STARTED_AT:.2f}s after start")
+        except Exception as e:
+            logger.error(f"Error warming up: {str(e)}")
+    thread = threading.Thread(target=run, name="agrodoc-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def run_ingest_job(job: IngestJob) -> None:
+    """Run a queued ingest request through the preprocess, embed and store pipeline."""
+    # Documents that fail to parse are reported in the job's errors as they happen
+    job.stats["errors"] = job.errors
+    try:
+        # Stream chunks through embedding and storage in batches
+        ingest.ingest_documents(job.documents, job.metadata, get_rag(), stats=job.stats)
+    finally:
+        remove_uploads(job.uploads)
+    if job.errors and not job.stats["pages"]:
+        raise RuntimeError("None of the documents could be read")
+
+def decode_documents(documents: List, metadata: List[Dict]) -> List:
+    """Decode base64-encoded PDF documents to bytes; raises ValueError naming the first one that fails."""
+    processed_documents = []
+    for i, doc in enumerate(documents):
+        meta = metadata[i] if i < len(metadata) else {}
+        # Check if this is a PDF document (base64 encoded)
+        if meta.get('type') == 'pdf':
+            try:
+                # Decode base64 string to bytes
+                processed_documents.append(base64.b64decode(doc))
+            except Exception as pdf_error:
+                logger.error(f"Error decoding PDF: {str(pdf_error)}")
+                raise ValueError(f"Error processing PDF: {str(pdf_error)}")
+        else:
+            processed_documents.append(doc)
+    return processed_documents
+
+queue_config = load_config().get("ingest_queue", {})
+ingest_jobs = IngestJobQueue(
+    run_ingest_job,
+    # Job progress lives in SQLite so any server worker process can report on any job
+    IngestJobStore(
+        queue_config.get("store_path", "data/processed/ingest_jobs.sqlite3"),
+        heartbeat_timeout=queue_config.get("heartbeat_timeout_seconds", 60)
+    ),
+    workers=queue_config.get("workers", 1),
+    max_depth=queue_config.get("max_depth", 8),
+    max_finished=queue_config.get("max_finished_jobs", 100)
+)
+# Uploads left behind by a process that was killed mid-request or mid-job
+try:
+    sweep_uploads(SpoolingRequest.upload_dir, ingest_jobs.store.active_uploads(), uploads_config.get("stale_after_seconds", 3600))
+except Exception as e:
+    logger.error(f"Error sweeping stale uploads: {str(e)}")
+metrics.REGISTRY.register(metrics.Gauge(
+    "agrodoc_ingest_queue_depth", "Ingest jobs waiting for a worker, across all server processes.", ingest_jobs.depth
+))
+metrics.REGISTRY.register(metrics.Gauge(
+    "agrodoc_ready", "1 once the model, ChromaDB and Groq client are initialized.", lambda: int(is_ready())
+))
+
+# Each worker process runs at most max_in_flight requests at once; the rest wait
+# queue_timeout seconds for a slot and are then turned away with a 503
+serving_config = load_config().get("serving", {})
+admission = AdmissionController(
+    max_in_flight=serving_config.get("max_in_flight", 8),
+    queue_timeout=serving_config.get("queue_timeout", 2.0)
+) if serving_config.get("max_in_flight", 8) else None
+# Cheap endpoints that must answer even when the worker is saturated
+ADMISSION_EXEMPT = {"health_check", "readiness_check", "metrics_endpoint", "ingest_status"}
+metrics.REGISTRY.register(metrics.Gauge(
+    "agrodoc_requests_in_flight", "Requests holding an admission slot in this worker.",
+    lambda: admission.in_flight if admission else 0
+))
+
+def wants_timings(data: Dict) -> bool:
+    """Whether the client asked for a per-stage timing breakdown in the response."""
+    return bool(data.get('timing')) or request.args.get('timing') in ('1', 'true')
+
+def request_filters(data: Dict) -> Dict:
+    """Filters from a JSON "filters" object, or from crop/region/category/source query parameters."""
+    filters = data.get('filters') if data is not request.args else None
+    if filters is None:
+        filters = {field: request.args.getlist(field) for field in FILTER_FIELDS if field in request.args}
+    return validate_filters(filters) if filters else None
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.timings = metrics.start_request_timings()
+
+@app.before_request
+def admit_request():
+    if admission is None or request.endpoint in ADMISSION_EXEMPT:
+        return None
+    admitted, waited = admission.acquire()
+    metrics.ADMISSION_WAIT_SECONDS.observe(waited)
+    if not admitted:
+        metrics.ADMISSION_REJECTED.inc()
+        retry_after = str(serving_config.get("retry_after", 1))
+        return jsonify({"error": "Server is busy, please retry"}), 503, {"Retry-After": retry_after}
+    g.admitted = True
+    return None
+
+@app.teardown_request
+def release_admission(exc):
+    # Streamed responses keep the request context, and so their slot, until the stream ends
+    if g.pop("admitted", False):
+        admission.release()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unknown"
+    metrics.HTTP_SECONDS.observe(time.perf_counter() - g.request_start, endpoint, str(response.status_code))
+    return response
+
+@app.teardown_request
+def remove_unclaimed_uploads(exc):
+    # Spooled files not handed to an ingest job (rejected, failed, truncated or abandoned
+    # requests) are deleted now
+    claimed = set(g.get("claimed_uploads", []))
+    unclaimed = [stream for stream in request.spooled_files if stream.name not in claimed]
+    for stream in unclaimed:
+        stream.close()
+    remove_uploads([stream.name for stream in unclaimed])
+
+def read_uploads() -> Tuple[List[Path], List[Dict]]:
+    """Spooled paths and metadata of the files in a multipart /ingest request.
+
+    Metadata defaults to the file name as source; a "metadata" form field may
+    hold a JSON list with extra metadata per file. Raises ValueError for
+    unsupported files or malformed metadata.
+    """
+    files = [f for f in request.files.getlist("files") if f.filename]
+    unsupported = [f.filename for f in files if not f.filename.lower().endswith(SUPPORTED_EXTENSIONS)]
+    if unsupported:
+        raise ValueError(f"Unsupported file type: {', '.join(unsupported)}")
+    extra = json.loads(request.form.get("metadata") or "[]")
+    # Chroma only stores flat metadata with scalar values
+    if not isinstance(extra, list) or not all(
+        isinstance(meta, dict) and all(isinstance(value, (str, int, float, bool)) for value in meta.values())
+        for meta in extra
+    ):
+        raise ValueError("metadata must be a JSON list of objects with string, number or boolean values")
+    metadata = [{"source": f.filename, **(extra[i] if i < len(extra) else {})} for i, f in enumerate(files)]
+    # Paths, unlike JSON strings, are opened as files by the ingest pipeline
+    return [Path(spooled_path(f)) for f in files], metadata
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Check if the API is running."""
     return jsonify({"status": "healthy"}), 200
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Check if the API can serve queries without paying start-up cost."""
+    if is_ready():
+        return jsonify({"status": "ready"}), 200
+    return jsonify({"status": "warming_up"}), 503
+
+@app.route('/warmup', methods=['POST'])
+def warmup():
+    """Initialize the model, ChromaDB and Groq client now and report how long each took."""
+    try:
+        timings = get_rag().warmup()
+        return jsonify({"status": "ready", "timings": timings}), 200
+    except Exception as e:
+        logger.error(f"Error warming up: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose stage latencies, cache and ingest counters in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/ingest', methods=['POST'])
 def ingest_documents():
-    """Ingest agricultural documents into ChromaDB."""
+    """Queue agricultural documents for ingestion into ChromaDB.
+
+    Accepts multipart/form-data with one or more "files" parts (streamed to
+    disk), or JSON with text and base64-encoded PDF documents.
+    """
     try:
-        data = request.get_json()
-        documents = data.get('documents', [])
-        metadata = data.get('metadata', [{}] * len(documents))
+        uploads = []
+        if request.mimetype == 'multipart/form-data':
+            try:
+                documents, metadata = read_uploads()
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            uploads = [str(path) for path in documents]
+        else:
+            data = request.get_json()
+            documents = data.get('documents', [])
+            metadata = data.get('metadata', [{}] * len(documents))
+            try:
+                documents = decode_documents(documents, metadata)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
         if not documents:
             return jsonify({"error": "No documents provided"}), 400
-        
-        # Process PDF documents if needed
-        processed_documents = []
-        for i, doc in enumerate(documents):
-            meta = metadata[i] if i < len(metadata) else {}
-            # Check if this is a PDF document (base64 encoded)
-            if meta.get('type') == 'pdf':
-                try:
-                    import base64
-                    # Decode base64 string to bytes
-                    pdf_bytes = base64.b64decode(doc)
-                    processed_documents.append(pdf_bytes)
-                except Exception as pdf_error:
-                    logger.error(f"Error decoding PDF: {str(pdf_error)}")
-                    return jsonify({"error": f"Error processing PDF: {str(pdf_error)}"}), 400
-            else:
-                processed_documents.append(doc)
-        
-        # Preprocess and generate embeddings
-        processed_docs = preprocess_documents(processed_documents, metadata)
-        # Extract metadata from processed documents to ensure length matches
-        doc_metadata = [doc.metadata for doc in processed_docs]
-        embeddings, texts, metadatas = generate_embeddings(processed_docs, doc_metadata)
-        
-        # Store in ChromaDB
-        rag.store_documents(texts, embeddings, metadatas)
-        return jsonify({"message": f"Ingested {len(texts)} document chunks"}), 200
+
+        job = ingest_jobs.submit(documents, metadata, uploads)
+        # From here the job deletes the spooled files when it is done with them
+        g.claimed_uploads = uploads
+        return jsonify({
+            "message": f"Queued {len(documents)} documents for ingestion",
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/ingest/{job.id}"
+        }), 202
+    except queue.Full:
+        return jsonify({"error": "Ingest queue is full, please retry later"}), 503, {"Retry-After": "30"}
+    except RequestEntityTooLarge:
+        return jsonify({"error": f"Upload exceeds {uploads_config.get('max_request_mb', 512)} MB"}), 413
     except Exception as e:
         logger.error(f"Error ingesting documents: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/ingest/<job_id>', methods=['GET'])
+def ingest_status(job_id: str):
+    """Report progress of a queued ingest job."""
+    report = ingest_jobs.get(job_id)
+    if report is None:
+        return jsonify({"error": "Unknown ingest job"}), 404
+    return jsonify(report), 200
+
 @app.route('/query', methods=['POST'])
 def process_query():
     """Process a farmer's query and return an answer."""
@@ -72,13 +289,87 @@ def process_query():
         target_lang = data.get('target_lang', 'ur')
         if not query:
             return jsonify({"error": "Query is required"}), 400
+        try:
+            filters = request_filters(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Process query using RAG pipeline
-        result = rag.process_query(query, location, target_lang)
+        result = get_rag().process_query(query, location, target_lang, filters)
+        if wants_timings(data):
+            result["timings"] = g.timings.as_dict()
         return jsonify(result), 200
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/query/batch', methods=['POST'])
+def process_query_batch():
+    """Answer a batch of farmer queries in one pass."""
+    try:
+        data = request.get_json()
+        queries = data.get('queries', [])
+        default_lang = data.get('target_lang', 'ur')
+        if not queries:
+            return jsonify({"error": "Queries are required"}), 400
+        if not isinstance(queries, list):
+            return jsonify({"error": "queries must be a list"}), 400
+        max_queries = load_config().get("batch", {}).get("max_queries", 64)
+        if len(queries) > max_queries:
+            return jsonify({"error": f"At most {max_queries} queries per batch"}), 400
+
+        # Accept plain strings or per-query objects
+        queries = [item if isinstance(item, dict) else {"query": item} for item in queries]
+        try:
+            default_filters = request_filters(data)
+            for item in queries:
+                item.setdefault('target_lang', default_lang)
+                item['filters'] = validate_filters(item['filters']) if item.get('filters') else default_filters
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        results = get_rag().process_queries(queries)
+        response = {"results": results}
+        if wants_timings(data):
+            response["timings"] = g.timings.as_dict()
+        return jsonify(response), 200
+    except Exception as e:
+        logger.error(f"Error processing query batch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/query/stream', methods=['GET', 'POST'])
+def stream_query():
+    """Stream a farmer's answer as server-sent events."""
+    data = request.get_json(silent=True) or request.args
+    query = data.get('query', '')
+    location = data.get('location', None)
+    target_lang = data.get('target_lang', 'ur')
+    if not query:
+        return jsonify({"error": "Query is required"}), 400
+    try:
+        filters = request_filters(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def events():
+        try:
+            for event in get_rag().stream_answer(query, location, target_lang, filters):
+                name = event.pop("event")
+                yield f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Failed to process query'})}\n\n"
+
+    # Disable proxy buffering so each event reaches slow clients immediately
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+logger.info(f"Backend app created in {time.perf_counter() - STARTED_AT:.2f}s")
+# Under backend.serve the app is imported before fork; each worker warms up after forking instead
+if load_config().get("startup", {}).get("warmup_on_start", True) and os.getenv("AGRODOC_PREFORK") != "1":
+    warmup_in_background()
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,180 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Tuple
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        """Monotonic counter, optionally split by label values."""
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        """Value read from a callback at scrape time."""
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.read()}"
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """Cumulative-bucket histogram of observed values, optionally split by label values."""
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    bucket_labels = _format_labels(self.labels, label_values, 'le="%s"' % bound)
+                    yield f"{self.name}_bucket{bucket_labels} {count}"
+                bucket_labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+                yield f"{self.name}_bucket{bucket_labels} {series['count']}"
+                yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series['sum']}"
+                yield f"{self.name}_count{_format_labels(self.labels, label_values)} {series['count']}"
+
+class MetricsRegistry:
+    def __init__(self):
+        """Process-wide collection of metrics rendered in the Prometheus text format."""
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "agrodoc_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",)
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "agrodoc_stage_errors_total", "Errors raised or handled in each pipeline stage.", ("stage",)
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "agrodoc_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result")
+))
+INGEST_PAGES = REGISTRY.register(Counter(
+    "agrodoc_ingest_pages_total", "Document pages extracted during ingest."
+))
+INGEST_CHUNKS = REGISTRY.register(Counter(
+    "agrodoc_ingest_chunks_total", "Ingest chunks by outcome: produced, stored or skipped.", ("outcome",)
+))
+CONTEXT_TOKENS = REGISTRY.register(Counter(
+    "agrodoc_context_tokens_total", "Estimated prompt context tokens, as retrieved and after packing.", ("stage",)
+))
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "agrodoc_admission_wait_seconds", "Time requests waited for an in-flight slot.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "agrodoc_admission_rejected_total", "Requests turned away with 503 because every in-flight slot stayed busy."
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "agrodoc_http_request_duration_seconds", "HTTP request latency by endpoint and status.", ("endpoint", "status")
+))
+
+class RequestTimings:
+    def __init__(self):
+        """Per-request stage timings, shared with the worker threads serving the request."""
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        """Return the accumulated time per stage in milliseconds."""
+        with self._lock:
+            return {stage: round(seconds * 1000, 3) for stage, seconds in self._stages.items()}
+
+_request_timings: ContextVar = ContextVar("agrodoc_request_timings", default=None)
+
+def start_request_timings() -> RequestTimings:
+    """Collect a timing breakdown for stages run in the current context."""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+def record_duration(stage: str, seconds: float) -> None:
+    """Record time spent in a stage in the stage histogram and the current request's timings."""
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as a stage, counting an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        record_duration(stage, time.perf_counter() - start)
+
+def record_error(stage: str) -> None:
+    """Count an error that a stage handled without raising."""
+    STAGE_ERRORS.inc(stage)
+
+def record_cache(cache: str, hit: bool, count: int = 1) -> None:
+    """Count cache lookups for a named cache."""
+    if count:
+        CACHE_REQUESTS.inc(cache, "hit" if hit else "miss", amount=count)
@@ -0,0 +1,121 @@
+from backend.config import load_config
+from functools import lru_cache
+from typing import Dict, List, Optional
+import argparse
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Metadata fields attached to every chunk at ingest and usable as query filters
+PARTITION_FIELDS = ("crop", "region", "category")
+FILTER_FIELDS = PARTITION_FIELDS + ("source",)
+GENERAL = "general"
+# Chunks not about any particular crop or region stay eligible when filtering on those
+INCLUDES_GENERAL = ("crop", "region")
+
+class MetadataTagger:
+    def __init__(self, config: Dict):
+        """Infer crop, region and document category from text using the keyword lexicon in config."""
+        partitions_config = config.get("partitions", {})
+        self.default_category = partitions_config.get("default_category", GENERAL)
+        lexicons = {
+            "crop": partitions_config.get("crops", {}),
+            "region": partitions_config.get("regions", {}),
+            "category": partitions_config.get("categories", {})
+        }
+        unknown = set(lexicons["category"]) - set(config.get("sources", {}))
+        if unknown:
+            logger.warning(f"Partition categories not listed under sources: {sorted(unknown)}")
+        # One alternation per value; keywords match at the start of a word, so "pest" matches "pests"
+        self.patterns = {
+            field: {
+                value: re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + ")", re.IGNORECASE)
+                for value, keywords in lexicon.items() if keywords
+            }
+            for field, lexicon in lexicons.items()
+        }
+
+    def _best(self, field: str, text: str) -> Optional[str]:
+        counts = {value: len(pattern.findall(text)) for value, pattern in self.patterns[field].items()}
+        value, count = max(counts.items(), key=lambda item: item[1], default=(None, 0))
+        return value if count else None
+
+    def tag(self, text: str, metadata: Dict = None) -> Dict:
+        """Return metadata with crop, region and category set; values already present are kept."""
+        tagged = dict(metadata or {})
+        for field in PARTITION_FIELDS:
+            if not tagged.get(field):
+                default = self.default_category if field == "category" else GENERAL
+                tagged[field] = self._best(field, text) or default
+        return tagged
+
+    def classify(self, query: str) -> Dict[str, str]:
+        """Infer crop and region filters from a query; fields with no keyword match are left out."""
+        filters = {}
+        for field in INCLUDES_GENERAL:
+            value = self._best(field, query)
+            if value:
+                filters[field] = value
+        return filters
+
+@lru_cache(maxsize=1)
+def get_tagger() -> MetadataTagger:
+    """Return the process-wide tagger built from config."""
+    return MetadataTagger(load_config())
+
+def validate_filters(filters: Dict) -> Dict[str, List[str]]:
+    """Normalize request filters to lists of strings; raises ValueError on unknown fields or bad values."""
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    normalized = {}
+    for field, values in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter {field}, expected one of {', '.join(FILTER_FIELDS)}")
+        values = [values] if isinstance(values, str) else values
+        if not isinstance(values, list) or not values or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"Filter {field} must be a string or a non-empty list of strings")
+        normalized[field] = values
+    return normalized
+
+def build_where(filters: Dict) -> Optional[Dict]:
+    """Translate filters such as {"crop": "wheat", "region": ["punjab", "sindh"]} into a ChromaDB where clause."""
+    clauses = []
+    for field, values in validate_filters(filters or {}).items():
+        if field in INCLUDES_GENERAL and GENERAL not in values:
+            values = values + [GENERAL]
+        clauses.append({field: {"$in": sorted(set(values))}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def retag_collection(collection, batch_size: int = 1000) -> int:
+    """Add partition metadata to chunks stored before it existed, without re-embedding them."""
+    tagger = get_tagger()
+    updated = 0
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+        ids, metadatas = [], []
+        for doc_id, text, meta in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+            if not all((meta or {}).get(field) for field in PARTITION_FIELDS):
+                ids.append(doc_id)
+                metadatas.append(tagger.tag(text, meta))
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+    logger.info(f"Added partition metadata to {updated} chunks")
+    return updated
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage crop/region/category metadata of stored chunks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("retag", help="tag chunks in data/processed that have no partition metadata")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    import chromadb
+    collection = chromadb.PersistentClient(path="data/processed").get_or_create_collection("agri_docs")
+    print(f"Tagged {retag_collection(collection)} chunks")
+
+if __name__ == "__main__":
+    main()
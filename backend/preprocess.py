@@ -1,65 +1,240 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
-from typing import List, Dict, Union, BinaryIO
+from backend import metrics
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from collections import deque
+from typing import TYPE_CHECKING, List, Dict, Union, BinaryIO, Iterable, Iterator, Tuple
+from pathlib import Path
+import multiprocessing
+import itertools
+import threading
+import tempfile
 import logging
-import PyPDF2
+import time
 import io
 import os
 
+# langchain and PyPDF2 are imported where they are used, so importing this
+# module (e.g. at API startup) stays cheap until a document is ingested
+if TYPE_CHECKING:
+    from langchain.docstore.document import Document
+    import PyPDF2
+
 logger = logging.getLogger(__name__)
 
-def parse_pdf(file_content: Union[str, bytes, BinaryIO], filename: str = "") -> str:
-    """Parse PDF file content and extract text."""
+# Files are only ever read when given as a Path; a plain str is always document text,
+# so text arriving over the API can never name a file on the server
+PdfSource = Union[Path, bytes, BinaryIO]
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared page-extraction pool, started once per process."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Workers are forked from a clean server process rather than from this
+            # (multi-threaded) one, and only pay the import cost once
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["PyPDF2", __name__])
+            else:
+                context = multiprocessing.get_context("spawn")
+            _pdf_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pdf_pool
+
+@contextmanager
+def _open_pdf(file_content: PdfSource) -> Iterator["PyPDF2.PdfReader"]:
+    """Open a PDF for reading; files are read through a handle, so objects are loaded by seeking as needed."""
+    import PyPDF2
+    if isinstance(file_content, Path):
+        # Given a path, PdfReader would read the whole file into memory first
+        with open(file_content, 'rb') as f:
+            yield PyPDF2.PdfReader(f)
+    else:
+        yield PyPDF2.PdfReader(io.BytesIO(file_content) if isinstance(file_content, bytes) else file_content)
+
+def _extract_page_range(file_content: PdfSource, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract (page_number, text) for pages [start, stop); runs inside pool workers."""
+    with _open_pdf(file_content) as pdf_reader:
+        return [(page_num + 1, pdf_reader.pages[page_num].extract_text() or "") for page_num in range(start, stop)]
+
+def _is_text_file(doc: Union[str, PdfSource]) -> bool:
+    return isinstance(doc, Path) and doc.suffix.lower() == '.txt'
+
+def _is_pdf(doc: Union[str, PdfSource]) -> bool:
+    return isinstance(doc, (Path, bytes)) or hasattr(doc, 'read')
+
+def _read_text_file(path: Path) -> str:
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+def _spool_pdf(content: bytes) -> Path:
+    """Write an in-memory PDF to a temporary file so pool workers can read it by path."""
+    with tempfile.NamedTemporaryFile("wb", prefix="agrodoc-pdf-", suffix=".pdf", delete=False) as f:
+        f.write(content)
+    return Path(f.name)
+
+def _remove_spooled(path: Path) -> None:
     try:
-        if isinstance(file_content, str):
-            # If it's a file path
-            if os.path.exists(file_content):
-                with open(file_content, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    text = ""
-                    for page_num in range(len(pdf_reader.pages)):
-                        text += pdf_reader.pages[page_num].extract_text() + "\n"
-                    return text
-            # If it's already text content
-            return file_content
-        else:
-            # If it's bytes or file-like object
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content) if isinstance(file_content, bytes) else file_content)
-            text = ""
+        os.remove(path)
+    except OSError:
+        pass
+
+def _parse_error(errors: List[str], filename: str, error: Exception) -> None:
+    message = f"Error parsing PDF {filename}: {str(error)}"
+    logger.error(message)
+    if errors is not None:
+        errors.append(message)
+
+def iter_pdf_pages(file_content: PdfSource, filename: str = "", errors: List[str] = None) -> Iterator[Tuple[int, str]]:
+    """Lazily yield (page_number, text) for each page of a PDF; a parse failure is appended to errors if given."""
+    try:
+        with _open_pdf(file_content) as pdf_reader:
             for page_num in range(len(pdf_reader.pages)):
-                text += pdf_reader.pages[page_num].extract_text() + "\n"
-            return text
+                yield page_num + 1, pdf_reader.pages[page_num].extract_text() or ""
     except Exception as e:
-        logger.error(f"Error parsing PDF {filename}: {str(e)}")
-        return ""
+        _parse_error(errors, filename, e)
 
-def preprocess_documents(documents: List[Union[str, bytes, BinaryIO]], metadata: List[Dict] = None) -> List[Document]:
-    """Preprocess documents by cleaning and splitting into chunks."""
+def parse_pdf(file_content: Union[str, PdfSource], filename: str = "") -> str:
+    """Parse PDF file content and extract text."""
+    # If it's already text content
+    if isinstance(file_content, str):
+        return file_content
+    return "".join(text + "\n" for _, text in iter_pdf_pages(file_content, filename))
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most batch_size items."""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def iter_document_pages(documents: List[Union[str, PdfSource]], metadata: List[Dict] = None, workers: int = 1,
+                        pages_per_task: int = 8, errors: List[str] = None) -> Iterator[Tuple[Dict, int, str]]:
+    """Yield (metadata, page_number, text) in document order, extracting PDF pages across a process pool.
+
+    Text documents, given as a str or as a Path to a .txt file, are yielded as
+    a single page with page_number None; any other Path is read as a PDF. A str
+    is never treated as a path. At most 2 * workers page ranges are in
+    flight, so memory does not grow with the number or size of the documents.
+    The pool size is fixed by the first call. In-memory PDFs are written to a
+    temporary file once, so page ranges carry a path rather than a copy of the
+    whole document. PDFs that fail to parse are skipped and reported in errors
+    if given.
+    """
+    workers = min(workers, os.cpu_count() or 1)
+    pending = deque()
+    max_pending = max(1, workers) * 2
     try:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        processed_docs = []
-        
         for i, doc in enumerate(documents):
             # Get metadata for this document if available
             meta = metadata[i] if metadata and i < len(metadata) else {}
+            meta = meta or {}
             filename = meta.get('source', f'document_{i}')
-            
-            # Check if it might be a PDF and try to parse it
-            if isinstance(doc, bytes) or (isinstance(doc, str) and filename.lower().endswith('.pdf')):
-                doc_text = parse_pdf(doc, filename)
+
+            if _is_text_file(doc):
+                pending.append((meta, None, [(None, _read_text_file(doc))], None))
+            elif not _is_pdf(doc):
+                pending.append((meta, None, [(None, doc)], None))
+            elif workers <= 1 or hasattr(doc, 'read'):
+                # File handles can't be shipped to another process; read them here
+                pending.append((meta, None, iter_pdf_pages(doc, filename, errors), None))
             else:
-                doc_text = doc
-            
-            # Only process if we have content
-            if doc_text and doc_text.strip():
-                # Create document with metadata
-                document = Document(page_content=doc_text.strip(), metadata=meta)
-                processed_docs.append(document)
-        
-        # Split into chunks
-        chunks = text_splitter.split_documents(processed_docs)
+                spooled = _spool_pdf(doc) if isinstance(doc, bytes) else None
+                path = spooled or doc
+                try:
+                    # Seeks through the cross-reference table and page tree; page content is not read
+                    with _open_pdf(path) as pdf_reader:
+                        page_count = len(pdf_reader.pages)
+                except Exception as e:
+                    _parse_error(errors, filename, e)
+                    if spooled:
+                        _remove_spooled(spooled)
+                    continue
+                if not page_count and spooled:
+                    _remove_spooled(spooled)
+                executor = _get_pdf_pool(workers)
+                for start in range(0, page_count, pages_per_task):
+                    stop = min(start + pages_per_task, page_count)
+                    future = executor.submit(_extract_page_range, path, start, stop)
+                    # The last range of a spooled document deletes the file once drained
+                    pending.append((meta, filename, future, spooled if stop == page_count else None))
+                    while len(pending) > max_pending:
+                        yield from _drain(pending.popleft(), errors)
+            while len(pending) > max_pending:
+                yield from _drain(pending.popleft(), errors)
+        while pending:
+            yield from _drain(pending.popleft(), errors)
+    finally:
+        # Don't leave abandoned page ranges running in the shared pool
+        for _, filename, pages, spooled in pending:
+            if filename is not None:
+                pages.cancel()
+            if spooled:
+                _remove_spooled(spooled)
+
+def _drain(entry: Tuple, errors: List[str] = None) -> Iterator[Tuple[Dict, int, str]]:
+    meta, filename, pages, spooled = entry
+    if filename is not None:
+        try:
+            pages = pages.result()
+        except Exception as e:
+            _parse_error(errors, filename, e)
+            pages = []
+        finally:
+            if spooled:
+                _remove_spooled(spooled)
+    for page_number, text in pages:
+        yield meta, page_number, text
+
+def iter_document_chunks(documents: List[Union[str, PdfSource]], metadata: List[Dict] = None, chunk_size: int = 1000,
+                         chunk_overlap: int = 200, workers: int = 1, pages_per_task: int = 8,
+                         stats: Dict = None) -> Iterator["Document"]:
+    """Yield chunks as pages are extracted, recording the page number in each chunk's metadata.
+
+    Progress counters are kept in stats if given, and documents that could not
+    be parsed are listed in stats["errors"].
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain.docstore.document import Document
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    errors = stats.setdefault("errors", []) if stats is not None else None
+    pages = iter_document_pages(documents, metadata, workers, pages_per_task, errors)
+    while True:
+        # Time extraction and splitting only, not the consumer's work between pages
+        start = time.perf_counter()
+        item = next(pages, None)
+        if item is None:
+            break
+        meta, page_number, text = item
+        metrics.INGEST_PAGES.inc()
+        if stats is not None:
+            stats["pages"] = stats.get("pages", 0) + 1
+        # Only process if we have content
+        if not text or not text.strip():
+            metrics.record_duration("extract", time.perf_counter() - start)
+            continue
+        chunk_meta = dict(meta)
+        if page_number is not None:
+            chunk_meta["page"] = page_number
+        chunks = text_splitter.split_text(text.strip())
+        metrics.record_duration("extract", time.perf_counter() - start)
+        metrics.INGEST_CHUNKS.inc("produced", amount=len(chunks))
+        for chunk in chunks:
+            if stats is not None:
+                stats["chunks"] = stats.get("chunks", 0) + 1
+            yield Document(page_content=chunk, metadata=dict(chunk_meta))
+
+def preprocess_documents(documents: List[Union[str, PdfSource]], metadata: List[Dict] = None) -> List["Document"]:
+    """Preprocess documents by cleaning and splitting into chunks."""
+    try:
+        with metrics.timed("preprocess"):
+            chunks = list(iter_document_chunks(documents, metadata))
         logger.info(f"Preprocessed {len(documents)} documents into {len(chunks)} chunks")
         return chunks
     except Exception as e:
         logger.error(f"Error preprocessing documents: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -1,106 +1,479 @@
-import chromadb
-import groq
-import requests
-from translate import Translator
-from chromadb.utils import embedding_functions
-import yaml
+from backend.config import load_config
+from backend.embeddings import get_embedding_engine
+from backend.cache import LRUCache
+from backend.answer_cache import AnswerCache
+from backend.weather import WeatherClient
+from backend.translation import SentenceBuffer, TranslationService, create_translation_service, join_sentences
+from backend.context import pack_context
+from backend.partitions import build_where, get_tagger
+from backend import metrics
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import contextvars
+import itertools
+import json
+import threading
 import os
+import re
+import time
+import hashlib
 import logging
-from typing import List, Dict
+from typing import Any, Callable, Iterator, List, Dict, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+def normalize_query(query: str) -> str:
+    """Normalize query text so trivially different phrasings share cache entries."""
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+def chunk_id(text: str, source: str = "") -> str:
+    """Content-addressed id for a chunk, stable across ingests of the same source."""
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()
+
 class AgroDocRAG:
-    def __init__(self):
-        """Initialize RAG pipeline with persistent ChromaDB, Groq LLM, and translation."""
-        with open('config/config.yaml', 'r') as f:
-            self.config = yaml.safe_load(f)
-        
-        # Use persistent ChromaDB to store data in data/processed/
-        self.client = chromadb.PersistentClient(path="data/processed")
-        self.collection = self.client.get_or_create_collection("agri_docs")
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=self.config["embedding_model"]
+    def __init__(self, groq_client=None, weather_client: WeatherClient = None, translator: TranslationService = None):
+        """Initialize RAG pipeline with persistent ChromaDB, Groq LLM, and translation.
+
+        The Groq client, weather client and translator can be injected, e.g. to
+        run against local stand-ins. ChromaDB, the Groq client and the embedding
+        model are created on first use (or by warmup), so construction is cheap.
+        """
+        self.config = load_config()
+        self._init_lock = threading.Lock()
+
+        # Persistent ChromaDB in data/processed/, opened by the collection property
+        self.client = None
+        self._collection = None
+        # Queries can instead be served from an exported edge index, without ChromaDB
+        retrieval_config = self.config.get("retrieval", {})
+        self.retrieval_backend = retrieval_config.get("backend", "chroma")
+        self._edge_index = None
+        # Shared with generate_embeddings so each process holds a single model copy
+        self.embedding_engine = get_embedding_engine()
+        self.query_embedding_cache = LRUCache(self.config.get("query_cache_size", 1024))
+        self._groq_client = groq_client
+        # Initialize translation with its persistent translation memory
+        self.translator = translator or create_translation_service(self.config)
+        self.weather_api_key = os.getenv("WEATHER_API_KEY")
+        weather_config = self.config.get("weather", {})
+        self.weather_client = weather_client or WeatherClient(
+            api_key=self.weather_api_key,
+            base_url=weather_config.get("base_url", "http://api.openweathermap.org/data/2.5/weather"),
+            timeout=weather_config.get("timeout", 3),
+            ttl_seconds=weather_config.get("ttl_seconds", 600),
+            negative_ttl_seconds=weather_config.get("negative_ttl_seconds", 60),
+            cache_size=weather_config.get("cache_size", 1024),
+            pool_size=weather_config.get("pool_size", 10)
+        )
+        # Persistent answer cache, also used as the offline fallback
+        answer_cache_config = self.config.get("answer_cache", {})
+        self.answer_cache = AnswerCache(
+            path=answer_cache_config.get("path", "data/processed/answer_cache.sqlite3"),
+            max_entries=answer_cache_config.get("max_entries", 5000),
+            ttl_seconds=answer_cache_config.get("ttl_seconds", 604800),
+            similarity_threshold=answer_cache_config.get("similarity_threshold", 0.95),
+            touch_interval=answer_cache_config.get("touch_interval_seconds", 300)
         )
-        # Initialize Groq client with fallback
+        # Independent stages of a query run side by side on this pool
+        concurrency_config = self.config.get("query_concurrency", {})
+        self.concurrent = concurrency_config.get("enabled", True)
+        self.stage_timeouts = concurrency_config.get("timeouts", {})
+        self.executor = ThreadPoolExecutor(
+            max_workers=concurrency_config.get("max_workers", 8),
+            thread_name_prefix="agrodoc-query"
+        )
+        # Retrieval gets its own pool so its timeout is never spent queued behind other
+        # requests' translation groups; each admitted request retrieves at most once at a time
+        serving_config = self.config.get("serving", {})
+        self.retrieve_executor = ThreadPoolExecutor(
+            max_workers=concurrency_config.get("retrieve_workers")
+            or serving_config.get("max_in_flight", 8)
+            or concurrency_config.get("max_workers", 8),
+            thread_name_prefix="agrodoc-retrieve"
+        )
+        # Answer generation for batch requests runs on its own pool, so batch items
+        # can wait on query-pool stages without starving each other
+        batch_config = self.config.get("batch", {})
+        self.batch_executor = ThreadPoolExecutor(
+            max_workers=batch_config.get("concurrency", 4),
+            thread_name_prefix="agrodoc-batch"
+        )
+
+    @property
+    def collection(self):
+        """The ChromaDB collection, opened on first use."""
+        if self._collection is None:
+            with self._init_lock:
+                if self._collection is None:
+                    start = time.perf_counter()
+                    import chromadb
+                    self.client = chromadb.PersistentClient(path="data/processed")
+                    self._collection = self.client.get_or_create_collection("agri_docs")
+                    logger.info(f"Opened ChromaDB collection in {time.perf_counter() - start:.2f}s")
+        return self._collection
+
+    @property
+    def edge_index(self):
+        """The exported edge index used when retrieval.backend is "edge", opened on first use."""
+        if self._edge_index is None:
+            with self._init_lock:
+                if self._edge_index is None:
+                    from backend.edge_index import EdgeIndex
+                    retrieval_config = self.config.get("retrieval", {})
+                    self._edge_index = EdgeIndex(
+                        path=retrieval_config.get("edge_index_path", "data/edge_index"),
+                        nprobe=retrieval_config.get("nprobe", 8)
+                    )
+                    logger.info(f"Opened edge index with {len(self._edge_index)} vectors")
+        return self._edge_index
+
+    @property
+    def groq_client(self):
+        """The Groq client, created on first use."""
+        if self._groq_client is None:
+            with self._init_lock:
+                if self._groq_client is None:
+                    import groq
+                    # Initialize Groq client with fallback
+                    try:
+                        self._groq_client = groq.Groq(api_key=os.getenv("GROQ_API_KEY"))
+                    except TypeError:
+                        # Handle case where proxies parameter is not supported
+                        import httpx
+                        self._groq_client = groq.Groq(
+                            api_key=os.getenv("GROQ_API_KEY"),
+                            http_client=httpx.Client(follow_redirects=True)
+                        )
+        return self._groq_client
+
+    @property
+    def ready(self) -> bool:
+        """Whether every lazily created component is initialized, so queries pay no start-up cost."""
+        store = self._edge_index if self.retrieval_backend == "edge" else self._collection
+        return self.embedding_engine.loaded and store is not None and self._groq_client is not None
+
+    def warmup(self) -> Dict[str, float]:
+        """Initialize the embedding model, vector store and the Groq client now; return seconds spent on each."""
+        timings = {}
+        start = time.perf_counter()
+        # One encode also runs the model's first-call setup
+        self.embedding_engine.encode(["warmup"])
+        timings["embedding_model"] = time.perf_counter() - start
+        start = time.perf_counter()
+        if self.retrieval_backend == "edge":
+            self.edge_index
+            timings["edge_index"] = time.perf_counter() - start
+        else:
+            self.collection
+            timings["chromadb"] = time.perf_counter() - start
+        start = time.perf_counter()
+        self.groq_client
+        timings["groq_client"] = time.perf_counter() - start
+        logger.info(f"Warmed up in {sum(timings.values()):.2f}s: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+        return timings
+
+    def _submit(self, fn: Callable, *args, executor: ThreadPoolExecutor = None) -> Future:
+        """Run fn on the query pool (or the given executor), or inline when concurrent mode is disabled."""
+        if self.concurrent:
+            # Carry the caller's context so stage timings land on the right request
+            return (executor or self.executor).submit(contextvars.copy_context().run, fn, *args)
+        future = Future()
         try:
-            self.groq_client = groq.Groq(api_key=os.getenv("GROQ_API_KEY"))
-        except TypeError:
-            # Handle case where proxies parameter is not supported
-            import httpx
-            self.groq_client = groq.Groq(
-                api_key=os.getenv("GROQ_API_KEY"),
-                http_client=httpx.Client(follow_redirects=True)
-            )
-        # Initialize translators
-        self.translators = {"ur": Translator(to_lang="ur")}
-        self.weather_api_key = os.getenv("WEATHER_API_KEY")
-        self.offline_cache = {}  # Simple cache for offline answers
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
 
-    def store_documents(self, texts: List[str], embeddings: List, metadatas: List[Dict]) -> None:
-        """Store document chunks and embeddings in ChromaDB."""
+    def _stage_result(self, future: Future, stage: str, default: Any) -> Any:
+        """Wait for a stage up to its configured timeout, falling back to default."""
         try:
-            self.collection.add(
+            return future.result(timeout=self.stage_timeouts.get(stage))
+        except FutureTimeoutError:
+            logger.warning(f"{stage} stage timed out after {self.stage_timeouts.get(stage)}s")
+            metrics.record_error(stage)
+            return default
+        except Exception as e:
+            logger.error(f"Error in {stage} stage: {str(e)}")
+            metrics.record_error(stage)
+            return default
+
+    def store_documents(self, texts: List[str], embeddings: List, metadatas: List[Dict], ids: List[str] = None) -> None:
+        """Upsert document chunks and embeddings in ChromaDB."""
+        try:
+            if not texts:
+                return
+            self.collection.upsert(
                 documents=texts,
                 embeddings=embeddings,
                 metadatas=metadatas,
-                ids=[f"doc_{i}" for i in range(len(texts))]
+                ids=ids or [chunk_id(text, (meta or {}).get("source", "")) for text, meta in zip(texts, metadatas)]
             )
             logger.info(f"Stored {len(texts)} document chunks in ChromaDB at data/processed/")
+            # Cached answers may no longer reflect the collection
+            self.answer_cache.invalidate()
         except Exception as e:
             logger.error(f"Error storing documents: {str(e)}")
             raise
 
-    def retrieve_context(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Retrieve relevant document chunks from ChromaDB."""
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries, encoding only those missing from the query embedding cache."""
+        keys = [normalize_query(query) for query in queries]
+        embeddings = [self.query_embedding_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        metrics.record_cache("query_embedding", True, len(keys) - len(missing))
+        metrics.record_cache("query_embedding", False, len(missing))
+        if missing:
+            with metrics.timed("embed"):
+                encoded = dict(zip(missing, self.embedding_engine.encode(missing)))
+            for key, embedding in encoded.items():
+                self.query_embedding_cache.put(key, embedding)
+            embeddings = [embedding if embedding is not None else encoded[key] for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        """Return the subset of ids already stored in the collection."""
+        if not ids:
+            return set()
+        return set(self.collection.get(ids=ids, include=[])["ids"])
+
+    def stored_metadatas(self, ids: List[str]) -> Dict[str, Dict]:
+        """Return the metadata of the ids already stored in the collection."""
+        if not ids:
+            return {}
+        stored = self.collection.get(ids=ids, include=["metadatas"])
+        return {doc_id: meta or {} for doc_id, meta in zip(stored["ids"], stored["metadatas"])}
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict]) -> None:
+        """Replace the metadata of stored chunks without re-embedding them."""
+        if ids:
+            self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete_stale(self, source: str, keep_ids: Set[str]) -> int:
+        """Delete chunks of a source that are not in keep_ids, e.g. after the file changed."""
         try:
-            query_embedding = self.embedding_function([query])[0]
+            stored = self.collection.get(where={"source": source}, include=[])["ids"]
+            stale = [doc_id for doc_id in stored if doc_id not in keep_ids]
+            if stale:
+                self.collection.delete(ids=stale)
+                self.answer_cache.invalidate()
+                logger.info(f"Deleted {len(stale)} stale chunks of {source}")
+            return len(stale)
+        except Exception as e:
+            logger.error(f"Error deleting stale chunks of {source}: {str(e)}")
+            raise
+
+    def lookup_answer(self, query: str, query_embedding: List[float] = None) -> str:
+        """Return a cached answer for the query or a near-duplicate of it, if any."""
+        if query_embedding is None:
+            query_embedding = self.embed_queries([query])[0]
+        cached = self.answer_cache.lookup(normalize_query(query), query_embedding)
+        metrics.record_cache("answer", cached is not None)
+        return cached["answer"] if cached else None
+
+    def retrieve_context(self, query: str, top_k: int = 5, where: Dict = None) -> List[Dict]:
+        """Retrieve relevant document chunks from ChromaDB."""
+        return self.retrieve_contexts([query], top_k, wheres=[where])[0]
+
+    def _search(self, query_embeddings: List, top_k: int, with_embeddings: bool, where: Dict) -> List[List[Dict]]:
+        if self.retrieval_backend == "edge":
+            with metrics.timed("retrieve"):
+                return self.edge_index.search(query_embeddings, top_k, with_embeddings=with_embeddings, where=where)
+        with metrics.timed("retrieve"):
             results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k
+                query_embeddings=query_embeddings,
+                n_results=top_k,
+                where=where,
+                include=["documents", "metadatas", "embeddings"] if with_embeddings else ["documents", "metadatas"]
             )
-            return [
-                {"text": doc, "metadata": meta}
-                for doc, meta in zip(results["documents"][0], results["metadatas"][0])
-            ]
+        contexts = [
+            [{"text": doc, "metadata": meta} for doc, meta in zip(documents, metadatas)]
+            for documents, metadatas in zip(results["documents"], results["metadatas"])
+        ]
+        if with_embeddings:
+            for context, embeddings in zip(contexts, results["embeddings"]):
+                for item, embedding in zip(context, embeddings):
+                    item["embedding"] = embedding
+        return contexts
+
+    def retrieve_contexts(self, queries: List[str], top_k: int = 5, with_embeddings: bool = False,
+                          wheres: List[Dict] = None, query_embeddings: List = None) -> List[List[Dict]]:
+        """Retrieve chunks for many queries with one batched encode and one ChromaDB query per filter.
+
+        wheres optionally gives a metadata filter per query; queries sharing a
+        filter are searched together. With with_embeddings each chunk also
+        carries its stored "embedding". query_embeddings skips the encode when
+        the caller already has them.
+        """
+        try:
+            if query_embeddings is None:
+                query_embeddings = self.embed_queries(queries)
+            groups = {}
+            for i, where in enumerate(wheres or [None] * len(queries)):
+                groups.setdefault(json.dumps(where, sort_keys=True), (where, []))[1].append(i)
+            contexts = [[] for _ in queries]
+            for where, indices in groups.values():
+                results = self._search([query_embeddings[i] for i in indices], top_k, with_embeddings, where)
+                for i, context in zip(indices, results):
+                    contexts[i] = context
+            return contexts
         except Exception as e:
             logger.error(f"Error retrieving context: {str(e)}")
-            return []
+            return [[] for _ in queries]
+
+    def query_wheres(self, queries: List[str], filters: List[Dict] = None) -> List[Dict]:
+        """Metadata filter per query: from its explicit filters, else inferred from its text when auto_filter is on."""
+        auto_filter = self.config.get("partitions", {}).get("auto_filter", False)
+        wheres = []
+        for query, query_filters in zip(queries, filters or [None] * len(queries)):
+            if query_filters:
+                wheres.append(build_where(query_filters))
+            else:
+                wheres.append(build_where(get_tagger().classify(query)) if auto_filter else None)
+        return wheres
+
+    def assemble_contexts(self, queries: List[str], filters: List[Dict] = None,
+                          query_embeddings: List = None) -> List[List[Dict]]:
+        """Retrieve context for each query and pack it into the prompt token budget.
+
+        filters optionally gives crop/region/category/source filters per query.
+        Queries without them are filtered by the crop and region they mention if
+        partitions.auto_filter is on, falling back to an unfiltered search when
+        that finds nothing. With packing enabled, `context.fetch_k` candidates
+        are retrieved so that merged and deduplicated chunks can be replaced by
+        the next best ones. Queries are embedded once, unless query_embeddings
+        are given, and the vectors are reused for every search and for packing.
+        """
+        context_config = self.config.get("context", {})
+        wheres = self.query_wheres(queries, filters)
+        packing = context_config.get("enabled", True)
+        top_k = context_config.get("fetch_k", 10) if packing else context_config.get("top_k", 5)
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries)
+        candidates = self.retrieve_contexts(queries, top_k, with_embeddings=packing, wheres=wheres,
+                                            query_embeddings=query_embeddings)
+        # Inferred filters only narrow the search; if they exclude everything, search it all
+        retry = [i for i, items in enumerate(candidates) if not items and wheres[i] and not (filters and filters[i])]
+        if retry:
+            retried = self.retrieve_contexts([queries[i] for i in retry], top_k, with_embeddings=packing,
+                                             query_embeddings=[query_embeddings[i] for i in retry])
+            for i, items in zip(retry, retried):
+                candidates[i] = items
+        if not packing:
+            return candidates
+        with metrics.timed("pack"):
+            return [
+                pack_context(
+                    query_embedding,
+                    items,
+                    token_budget=context_config.get("token_budget", 800),
+                    max_chunks=context_config.get("top_k", 5),
+                    mmr_lambda=context_config.get("mmr_lambda", 0.7),
+                    dedup_threshold=context_config.get("dedup_threshold", 0.95),
+                    min_overlap=context_config.get("min_overlap", 50)
+                )
+                for query_embedding, items in zip(query_embeddings, candidates)
+            ]
 
     def fetch_weather_data(self, location: str) -> Dict:
         """Fetch real-time weather data."""
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid={self.weather_api_key}&units=metric"
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()
+            with metrics.timed("weather"):
+                weather_info = self.weather_client.get(location)
+            if "error" in weather_info:
+                metrics.record_error("weather")
+            return weather_info
         except Exception as e:
             logger.error(f"Error fetching weather data: {str(e)}")
             return {"error": "Unable to fetch weather data"}
 
-    def generate_answer(self, query: str, context: List[Dict]) -> str:
-        """Generate an answer using Groq LLM."""
-        try:
-            context_text = "\n".join([item["text"] for item in context])
-            prompt = f"""
+    def weather_context(self, location: str) -> Dict:
+        """Fetch weather for a location and format it as a context item, or None."""
+        weather_info = self.fetch_weather_data(location)
+        if weather_info and "error" not in weather_info:
+            weather_context = f"Weather in {location}: {weather_info['weather'][0]['description']}, Temp: {weather_info['main']['temp']}°C"
+            return {"text": weather_context, "metadata": {"source": "weather_api"}}
+        return None
+
+    def gather_context(self, query: str, location: str = None, filters: Dict = None,
+                       query_embedding: List[float] = None) -> Tuple[List[Dict], bool]:
+        """Retrieve document context and, if a location is given, weather context.
+
+        Also returns whether any documents were retrieved; it is False when
+        retrieval timed out, failed or found nothing.
+        """
+        # Retrieval and the weather lookup are independent, so overlap them
+        context_future = self._submit(
+            self.assemble_contexts, [query], [filters], [query_embedding] if query_embedding is not None else None,
+            executor=self.retrieve_executor
+        )
+        weather_future = self._submit(self.weather_context, location) if location else None
+        context = self._stage_result(context_future, "retrieve", [[]])[0]
+        retrieved = bool(context)
+        if weather_future is not None:
+            weather_item = self._stage_result(weather_future, "weather", None)
+            if weather_item:
+                context.append(weather_item)
+        return context, retrieved
+
+    def build_prompt(self, query: str, context: List[Dict]) -> str:
+        """Build the LLM prompt from the query and its context."""
+        context_text = "\n".join([item["text"] for item in context])
+        return f"""
             You are AgroDoc, a smart farmer assistant. Use the following context to answer the query accurately and concisely. If relevant, include agricultural insights or local weather advice.
             Context: {context_text}
             Query: {query}
             Answer in clear, simple language suitable for low-tech farmers.
             """
-            response = self.groq_client.chat.completions.create(
-                model=self.config["llm_model"],
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500
-            )
+
+    def generate_answer(self, query: str, context: List[Dict], cache: bool = True,
+                        query_embedding: List[float] = None) -> str:
+        """Generate an answer using Groq LLM; query_embedding, if known, keys the answer cache."""
+        try:
+            prompt = self.build_prompt(query, context)
+            with metrics.timed("llm"):
+                response = self.groq_client.chat.completions.create(
+                    model=self.config["llm_model"],
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=500,
+                    timeout=self.stage_timeouts.get("llm")
+                )
             answer = response.choices[0].message.content
             # Cache answer for offline use
-            self.offline_cache[query] = answer
+            if cache:
+                if query_embedding is None:
+                    query_embedding = self.embed_queries([query])[0]
+                self.answer_cache.store(normalize_query(query), query, answer, query_embedding)
             return answer
         except Exception as e:
             logger.error(f"Error generating answer: {str(e)}")
             # Check offline cache
-            return self.offline_cache.get(query, "Sorry, I couldn't generate an answer. Please try again.")
+            return self.lookup_answer(query, query_embedding) or "Sorry, I couldn't generate an answer. Please try again."
+
+    def stream_completion(self, query: str, context: List[Dict]) -> Iterator[str]:
+        """Yield answer text from the Groq LLM as it is generated."""
+        with metrics.timed("llm_first_token"):
+            stream = iter(self.groq_client.chat.completions.create(
+                model=self.config["llm_model"],
+                messages=[{"role": "user", "content": self.build_prompt(query, context)}],
+                max_tokens=500,
+                stream=True,
+                timeout=self.stage_timeouts.get("llm")
+            ))
+            first = next(stream, None)
+        for chunk in itertools.chain([first] if first is not None else [], stream):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def translate_sentence(self, text: str, target_lang: str = "ur") -> str:
+        """Translate a short piece of text on the calling thread."""
+        if target_lang == "en" or target_lang not in self.config.get("languages", {}):
+            return text
+        try:
+            with metrics.timed("translate_sentence"):
+                return self.translator.translate(text, target_lang)
+        except Exception as e:
+            logger.error(f"Error translating sentence: {str(e)}")
+            return text
 
     def translate_answer(self, text: str, target_lang: str = "ur") -> str:
         """Translate the answer to the target language."""
@@ -110,61 +483,175 @@ class AgroDocRAG:
                 return text
                 
             # For other languages, use the appropriate translator
-            if target_lang in self.translators:
-                # The translate library has a character limit of 500
-                # Split the text into chunks of 400 characters to be safe
-                chunk_size = 400
-                chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-                
-                # Translate each chunk and join them back together
-                translated_chunks = []
-                for chunk in chunks:
-                    translated_chunk = self.translators[target_lang].translate(chunk)
-                    translated_chunks.append(translated_chunk)
-                
-                return ''.join(translated_chunks)
+            if target_lang in self.config.get("languages", {}):
+                # Packed requests for uncached sentences run concurrently on the query pool
+                with metrics.timed("translate"):
+                    return self.translator.translate(
+                        text,
+                        target_lang,
+                        submit=self._submit,
+                        timeout=self.stage_timeouts.get("translate")
+                    )
             else:
                 logger.warning(f"No translator available for language: {target_lang}")
                 return text
+        except TimeoutError:
+            logger.warning(f"translate stage timed out after {self.stage_timeouts.get('translate')}s")
+            return text
         except Exception as e:
             logger.error(f"Error translating answer: {str(e)}")
             return text
 
-    def process_query(self, query: str, location: str = None, target_lang: str = "ur") -> Dict:
+    def process_query(self, query: str, location: str = None, target_lang: str = "ur", filters: Dict = None) -> Dict:
         """Process a farmer's query, retrieve context, generate answer, and translate."""
         try:
-            # Check offline cache first
-            if query in self.offline_cache and not location:
-                answer = self.offline_cache[query]
-                translated_answer = self.translate_answer(answer, target_lang)
-                return {
-                    "answer": answer,
-                    "translated_answer": translated_answer,
-                    "context": [{"text": "Cached answer", "metadata": {"source": "offline_cache"}}]
-                }
-            
-            # Retrieve context
-            context = self.retrieve_context(query)
-            
-            # Fetch weather data if location provided
-            if location:
-                weather_info = self.fetch_weather_data(location)
-                if weather_info and "error" not in weather_info:
-                    weather_context = f"Weather in {location}: {weather_info['weather'][0]['description']}, Temp: {weather_info['main']['temp']}°C"
-                    context.append({"text": weather_context, "metadata": {"source": "weather_api"}})
-            
-            # Generate and translate answer
-            answer = self.generate_answer(query, context)
-            translated_answer = self.translate_answer(answer, target_lang)
-            
-            return {
-                "answer": answer,
-                "translated_answer": translated_answer,
-                "context": context
-            }
+            with metrics.timed("total"):
+                # Check answer cache first; located answers depend on live weather, filtered ones on the filters
+                query_embedding = None if location or filters else self.embed_queries([query])[0]
+                answer = None if location or filters else self.lookup_answer(query, query_embedding)
+                if answer:
+                    return self._cached_result(answer, target_lang)
+
+                # Retrieve context
+                context, retrieved = self.gather_context(query, location, filters, query_embedding)
+
+                # Generate and translate answer
+                return self._answer_result(query, context, location, target_lang, filters, retrieved, query_embedding)
         except Exception as e:
             logger.error(f"Error processing query: {str(e)}")
             return {"error": "Failed to process query"}
 
+    def _cached_result(self, answer: str, target_lang: str) -> Dict:
+        return {
+            "answer": answer,
+            "translated_answer": self.translate_answer(answer, target_lang),
+            "context": [{"text": "Cached answer", "metadata": {"source": "answer_cache"}}]
+        }
+
+    def _answer_result(self, query: str, context: List[Dict], location: str, target_lang: str, filters: Dict = None,
+                       retrieved: bool = True, query_embedding: List[float] = None) -> Dict:
+        # An answer written without documents (retrieval fell back to nothing) must not be reused
+        answer = self.generate_answer(query, context, cache=retrieved and not (location or filters),
+                                      query_embedding=query_embedding)
+        return {
+            "answer": answer,
+            "translated_answer": self.translate_answer(answer, target_lang),
+            "context": context
+        }
+
+    def _batch_submit(self, fn: Callable, *args) -> Future:
+        if self.concurrent:
+            return self.batch_executor.submit(contextvars.copy_context().run, fn, *args)
+        return self._submit(fn, *args)
+
+    def process_queries(self, queries: List[Dict]) -> List[Dict]:
+        """Answer many queries, each a dict with query, location, target_lang and optional filters.
+
+        All queries are embedded in one batched model call and searched with one
+        ChromaDB query per distinct filter; answers are then generated on the
+        batch pool. Each result carries its own error if that query failed.
+        """
+        results = [None] * len(queries)
+        try:
+            texts = [item.get("query", "") for item in queries]
+            # Anything but a non-empty string fails on its own rather than in the shared embedding call
+            valid = [i for i, text in enumerate(texts) if isinstance(text, str) and text]
+            for i, text in enumerate(texts):
+                if not text:
+                    results[i] = {"error": "Query is required"}
+                elif not isinstance(text, str):
+                    results[i] = {"error": "Query must be a string"}
+            # Every query is embedded in a single encode and the vectors are reused from here on
+            embeddings = dict(zip(valid, self.embed_queries([texts[i] for i in valid])))
+
+            to_retrieve = []
+            for i in valid:
+                if not queries[i].get("location") and not queries[i].get("filters"):
+                    answer = self.lookup_answer(texts[i], embeddings[i])
+                    if answer:
+                        results[i] = self._batch_submit(self._cached_result, answer, queries[i].get("target_lang", "ur"))
+                        continue
+                to_retrieve.append(i)
+
+            weather_futures = {
+                i: self._submit(self.weather_context, queries[i]["location"])
+                for i in to_retrieve if queries[i].get("location")
+            }
+            contexts = self.assemble_contexts(
+                [texts[i] for i in to_retrieve], [queries[i].get("filters") for i in to_retrieve],
+                [embeddings[i] for i in to_retrieve]
+            ) if to_retrieve else []
+            for i, context in zip(to_retrieve, contexts):
+                retrieved = bool(context)
+                if i in weather_futures:
+                    weather_item = self._stage_result(weather_futures[i], "weather", None)
+                    if weather_item:
+                        context.append(weather_item)
+                results[i] = self._batch_submit(
+                    self._answer_result, texts[i], context, queries[i].get("location"), queries[i].get("target_lang", "ur"),
+                    queries[i].get("filters"), retrieved, embeddings[i]
+                )
+
+            for i in valid:
+                try:
+                    results[i] = results[i].result()
+                except Exception as e:
+                    logger.error(f"Error processing batch query {i}: {str(e)}")
+                    results[i] = {"error": "Failed to process query"}
+            return results
+        except Exception as e:
+            logger.error(f"Error processing batch queries: {str(e)}")
+            return [result if isinstance(result, dict) else {"error": "Failed to process query"} for result in results]
+
+    def stream_answer(self, query: str, location: str = None, target_lang: str = "ur", filters: Dict = None) -> Iterator[Dict]:
+        """Stream a query's answer as events: context, LLM tokens, translated sentences and done.
+
+        Sentences are translated on the query pool as soon as they are complete
+        and emitted in order, while the LLM keeps streaming.
+        """
+        query_embedding = None if location or filters else self.embed_queries([query])[0]
+        answer = None if location or filters else self.lookup_answer(query, query_embedding)
+        retrieved = False
+        if answer:
+            context = [{"text": "Cached answer", "metadata": {"source": "answer_cache"}}]
+        else:
+            context, retrieved = self.gather_context(query, location, filters, query_embedding)
+        yield {"event": "context", "context": context}
+
+        buffer = SentenceBuffer()
+        pending = deque()
+        answer_parts = []
+        translated_parts = []
+
+        def emit(token: str, block: bool = False) -> Iterator[Dict]:
+            if token:
+                answer_parts.append(token)
+                yield {"event": "token", "text": token}
+            sentences = buffer.flush() if block else buffer.feed(token)
+            for breaks, sentence in sentences:
+                pending.append((breaks, sentence, self._submit(self.translate_sentence, sentence, target_lang)))
+            while pending and (block or pending[0][2].done()):
+                breaks, sentence, future = pending.popleft()
+                translated = self._stage_result(future, "translate", sentence)
+                translated_parts.append((breaks, translated))
+                # breaks: line breaks before this sentence, so clients keep the answer's lines and lists
+                yield {"event": "sentence", "text": sentence, "translated": translated, "breaks": breaks}
+
+        generated = answer is None
+        try:
+            for token in ([answer] if answer else self.stream_completion(query, context)):
+                yield from emit(token)
+        except Exception as e:
+            logger.error(f"Error generating answer: {str(e)}")
+            generated = False
+            if not answer_parts:
+                yield from emit(self.lookup_answer(query, query_embedding) or "Sorry, I couldn't generate an answer. Please try again.")
+        yield from emit("", block=True)
+
+        answer = "".join(answer_parts)
+        if generated and retrieved and not (location or filters):
+            self.answer_cache.store(normalize_query(query), query, answer, query_embedding)
+        yield {"event": "done", "answer": answer, "translated_answer": join_sentences(translated_parts)}
+
 if __name__ == "__main__":
     rag = AgroDocRAG()
\ No newline at end of file
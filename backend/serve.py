@@ -0,0 +1,88 @@
+"""Production entry point: gunicorn with a preloaded model, worker processes and threads.
+
+    python -m backend.serve --workers 4 --threads 16
+
+Settings default to the `serving` section of config/config.yaml.
+"""
+from gunicorn.app.base import BaseApplication
+from backend.config import load_config
+from backend.embeddings import get_embedding_engine
+from typing import Dict
+import multiprocessing
+import argparse
+import logging
+import time
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+def _workers(serving_config: Dict) -> int:
+    return serving_config.get("workers") or multiprocessing.cpu_count()
+
+def post_fork(server, worker) -> None:
+    """Per-worker set-up: size torch's thread pool to this worker's share of the cores, then warm up."""
+    serving_config = load_config().get("serving", {})
+    # server.cfg.workers includes a --workers override, unlike the config file
+    torch_threads = serving_config.get("torch_threads") or max(1, multiprocessing.cpu_count() // server.cfg.workers)
+    if "torch" in sys.modules:
+        import torch
+        torch.set_num_threads(torch_threads)
+    # Without preload_app this is the worker's first import of main; the flag stops it from
+    # starting its own warm-up, so the one below is the only one
+    os.environ["AGRODOC_PREFORK"] = "1"
+    # ChromaDB, SQLite connections and thread pools are created here, never shared across fork
+    from backend import main
+    if load_config().get("startup", {}).get("warmup_on_start", True):
+        main.warmup_in_background()
+
+class AgroDocApplication(BaseApplication):
+    def __init__(self, options: Dict):
+        """Gunicorn application serving backend.main's Flask app."""
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        # Workers warm up after fork (see post_fork); the master only loads what is safe to share
+        os.environ["AGRODOC_PREFORK"] = "1"
+        start = time.perf_counter()
+        # Model weights loaded before fork are shared copy-on-write by every worker
+        get_embedding_engine().load()
+        from backend.main import app
+        logger.info(f"Preloaded embedding model and app in {time.perf_counter() - start:.2f}s")
+        return app
+
+def build_options(serving_config: Dict, bind: str = None, workers: int = None, threads: int = None) -> Dict:
+    """Gunicorn settings from the serving config, with command-line overrides."""
+    return {
+        "bind": bind or serving_config.get("bind", "0.0.0.0:5000"),
+        "workers": workers or _workers(serving_config),
+        "worker_class": "gthread",
+        "threads": threads or serving_config.get("threads", 16),
+        "timeout": serving_config.get("timeout", 120),
+        "graceful_timeout": serving_config.get("graceful_timeout", 30),
+        "keepalive": serving_config.get("keepalive", 5),
+        "backlog": serving_config.get("backlog", 2048),
+        "preload_app": serving_config.get("preload_model", True),
+        "post_fork": post_fork
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the AgroDoc API with gunicorn.")
+    parser.add_argument("--bind", help="address to listen on (default: serving.bind)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: serving.workers, or one per core)")
+    parser.add_argument("--threads", type=int, help="threads per worker (default: serving.threads)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    options = build_options(load_config().get("serving", {}), args.bind, args.workers, args.threads)
+    logger.info(f"Serving on {options['bind']} with {options['workers']} workers x {options['threads']} threads")
+    AgroDocApplication(options).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+from backend.cache import LRUCache
+from backend import metrics
+from concurrent.futures import wait
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Tuple
+import threading
+import sqlite3
+import logging
+import time
+import re
+import os
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends at Latin or Urdu terminal punctuation followed by whitespace, or at a line break
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?۔؟])\s+|\n+')
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, dropping empty fragments."""
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+class SentenceBuffer:
+    def __init__(self):
+        """Accumulate streamed text and release sentences once they are complete.
+
+        Each sentence is released with the number of line breaks between it and
+        the previous sentence, so the text's line structure can be rebuilt.
+        """
+        self._pending = ""
+        self._breaks = 0
+
+    def _release(self, text: str) -> List[Tuple[int, str]]:
+        released = []
+        start = 0
+        for boundary in list(SENTENCE_BOUNDARY.finditer(text)) + [None]:
+            sentence = text[start:boundary.start() if boundary else len(text)].strip()
+            if sentence:
+                released.append((self._breaks, sentence))
+                self._breaks = 0
+            if boundary:
+                self._breaks += boundary.group().count("\n")
+                start = boundary.end()
+        return released
+
+    def feed(self, text: str) -> List[Tuple[int, str]]:
+        """Add streamed text and return any (line_breaks, sentence) pairs completed by it."""
+        self._pending += text
+        boundaries = list(SENTENCE_BOUNDARY.finditer(self._pending))
+        if not boundaries:
+            return []
+        end = boundaries[-1].end()
+        complete, self._pending = self._pending[:end], self._pending[end:]
+        return self._release(complete)
+
+    def flush(self) -> List[Tuple[int, str]]:
+        """Return whatever text remains as the final (line_breaks, sentence) pair(s)."""
+        remaining, self._pending = self._pending, ""
+        return self._release(remaining)
+
+def join_sentences(sentences: List[Tuple[int, str]]) -> str:
+    """Join (line_breaks, sentence) pairs from SentenceBuffer, with spaces between sentences on one line."""
+    text = ""
+    for breaks, sentence in sentences:
+        text += ("\n" * breaks if breaks else " " if text else "") + sentence
+    return text
+
+class TranslationBackend(ABC):
+    """Provider that translates a block of text into a target language."""
+    @abstractmethod
+    def translate(self, text: str, target_lang: str) -> str:
+        """Translate text, which may span several lines, and return the translation."""
+
+class TranslateLibBackend(TranslationBackend):
+    def __init__(self):
+        """Backend using the `translate` library, one Translator per target language."""
+        self._translators = {}
+        self._lock = threading.Lock()
+
+    def translate(self, text: str, target_lang: str) -> str:
+        with self._lock:
+            if target_lang not in self._translators:
+                from translate import Translator
+                self._translators[target_lang] = Translator(to_lang=target_lang)
+            translator = self._translators[target_lang]
+        return translator.translate(text)
+
+class StubBackend(TranslationBackend):
+    def __init__(self, delay: float = 0.0):
+        """Local backend for tests and benchmarks that tags each line instead of translating it."""
+        self.delay = delay
+        self.calls = 0
+
+    def translate(self, text: str, target_lang: str) -> str:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return "\n".join(f"[{target_lang}] {line}" for line in text.split("\n"))
+
+TRANSLATION_BACKENDS = {"translate": TranslateLibBackend, "stub": StubBackend}
+
+class TranslationMemory:
+    def __init__(self, path: str = "data/processed/translation_memory.sqlite3", cache_size: int = 4096):
+        """Persistent (sentence, target_lang) -> translation store with an in-memory LRU in front."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS memory (
+                target_lang TEXT NOT NULL,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                PRIMARY KEY (target_lang, source)
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, sentences: List[str], target_lang: str) -> Dict[str, str]:
+        """Return the known translations among sentences."""
+        found = {}
+        missing = []
+        for sentence in sentences:
+            translation = self.cache.get((target_lang, sentence))
+            if translation is None:
+                missing.append(sentence)
+            else:
+                found[sentence] = translation
+        if missing:
+            try:
+                with self._lock:
+                    for i in range(0, len(missing), 500):
+                        batch = missing[i:i + 500]
+                        rows = self._conn.execute(
+                            f"SELECT source, translation FROM memory WHERE target_lang = ? AND source IN ({','.join('?' * len(batch))})",
+                            [target_lang] + batch
+                        ).fetchall()
+                        for source, translation in rows:
+                            found[source] = translation
+                            self.cache.put((target_lang, source), translation)
+            except Exception as e:
+                logger.error(f"Error reading translation memory: {str(e)}")
+        metrics.record_cache("translation_memory", True, len(found))
+        metrics.record_cache("translation_memory", False, len(sentences) - len(found))
+        return found
+
+    def put_many(self, translations: Dict[str, str], target_lang: str) -> None:
+        """Remember translations for later requests and other workers."""
+        for sentence, translation in translations.items():
+            self.cache.put((target_lang, sentence), translation)
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO memory (target_lang, source, translation) VALUES (?, ?, ?)",
+                    [(target_lang, sentence, translation) for sentence, translation in translations.items()]
+                )
+                self._conn.commit()
+        except Exception as e:
+            logger.error(f"Error writing translation memory: {str(e)}")
+
+class TranslationService:
+    def __init__(self, backend: TranslationBackend, memory: TranslationMemory = None, provider_limit: int = 400):
+        """Sentence-aware translation that packs uncached sentences into provider-sized requests."""
+        self.backend = backend
+        self.memory = memory
+        self.provider_limit = provider_limit
+
+    def _units(self, sentence: str) -> List[str]:
+        # Sentences over the provider limit are cut at word boundaries
+        if len(sentence) <= self.provider_limit:
+            return [sentence]
+        units = []
+        current = ""
+        for word in sentence.split(" "):
+            if current and len(current) + len(word) + 1 > self.provider_limit:
+                units.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        units.append(current)
+        return [unit[i:i + self.provider_limit] for unit in units for i in range(0, len(unit), self.provider_limit)]
+
+    def _pack(self, sentences: List[str]) -> List[List[str]]:
+        # One sentence per line, as many lines per request as the provider limit allows
+        groups = []
+        current = []
+        size = 0
+        for sentence in sentences:
+            if current and size + len(sentence) + 1 > self.provider_limit:
+                groups.append(current)
+                current = []
+                size = 0
+            current.append(sentence)
+            size += len(sentence) + 1
+        if current:
+            groups.append(current)
+        return groups
+
+    def _translate_group(self, group: List[str], target_lang: str) -> Dict[str, str]:
+        translated = self.backend.translate("\n".join(group), target_lang)
+        lines = translated.split("\n")
+        if len(lines) == len(group):
+            return dict(zip(group, (line.strip() for line in lines)))
+        if len(group) == 1:
+            return {group[0]: " ".join(line.strip() for line in lines if line.strip())}
+        # The provider merged or split lines, so they can't be matched to sentences; translate each on its own
+        return {sentence: self._translate_group([sentence], target_lang)[sentence] for sentence in group}
+
+    def translate(self, text: str, target_lang: str, submit: Callable = None, timeout: float = None) -> str:
+        """Translate text, reusing remembered sentences and translating the rest in packed requests.
+
+        `submit` schedules a packed request and returns a Future, so requests
+        can run concurrently; without it they run in order on this thread.
+        """
+        lines = [[unit for sentence in split_sentences(line) for unit in self._units(sentence)] for line in text.split("\n")]
+        sentences = list(dict.fromkeys(unit for line in lines for unit in line))
+        if not sentences:
+            return text
+        known = self.memory.get_many(sentences, target_lang) if self.memory else {}
+        missing = [sentence for sentence in sentences if sentence not in known]
+
+        groups = self._pack(missing)
+        if submit is None:
+            results = [self._translate_group(group, target_lang) for group in groups]
+        else:
+            futures = [submit(self._translate_group, group, target_lang) for group in groups]
+            _, not_done = wait(futures, timeout=timeout)
+            if not_done:
+                raise TimeoutError(f"Translation timed out after {timeout}s")
+            results = [future.result() for future in futures]
+
+        for group, result in zip(groups, results):
+            known.update(result)
+            if self.memory and all(result.values()):
+                self.memory.put_many(result, target_lang)
+        return "\n".join(" ".join(known[unit] for unit in line if known[unit]) for line in lines)
+
+def create_translation_service(config: Dict) -> TranslationService:
+    """Build the translation service described by the `translation` config section."""
+    translation_config = config.get("translation", {})
+    backend = TRANSLATION_BACKENDS[translation_config.get("backend", "translate")]()
+    memory = TranslationMemory(
+        path=translation_config.get("memory_path", "data/processed/translation_memory.sqlite3"),
+        cache_size=translation_config.get("memory_cache_size", 4096)
+    )
+    return TranslationService(backend, memory, provider_limit=translation_config.get("provider_limit", 400))
@@ -0,0 +1,71 @@
+from flask import Request
+from typing import IO, Iterable, List
+import tempfile
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "data/uploads"
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt')
+
+class SpoolingRequest(Request):
+    """Request whose multipart file parts are written to disk as they arrive.
+
+    Werkzeug hands each file part to the stream returned here in small chunks,
+    so an upload never has to fit in memory. The spooled files are kept after
+    the request so an ingest job can read them; remove them with remove_uploads.
+    Every file created is listed in spooled_files, including those of a body
+    that was truncated or abandoned before parsing finished.
+    """
+    upload_dir = UPLOAD_DIR
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spooled_files = []
+
+    def _get_file_stream(self, total_content_length: int, content_type: str, filename: str = None,
+                         content_length: int = None) -> IO[bytes]:
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # Keep the extension so the parser can tell PDFs from text files by path
+        suffix = os.path.splitext(filename or "")[1].lower()
+        stream = tempfile.NamedTemporaryFile(
+            "w+b", dir=self.upload_dir, prefix="upload-", suffix=suffix if suffix in SUPPORTED_EXTENSIONS else "", delete=False
+        )
+        self.spooled_files.append(stream)
+        return stream
+
+def spooled_path(file_storage) -> str:
+    """Finish writing an uploaded file and return the path it was spooled to."""
+    stream = file_storage.stream
+    stream.flush()
+    stream.close()
+    return stream.name
+
+def remove_uploads(paths: List[str]) -> None:
+    """Delete spooled uploads once they are no longer needed."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error removing upload {path}: {str(e)}")
+
+def sweep_uploads(upload_dir: str, keep: Iterable[str], older_than: float) -> int:
+    """Delete spooled uploads not written for older_than seconds and not in keep, e.g. left by a killed process."""
+    keep = {os.path.abspath(path) for path in keep}
+    cutoff = time.time() - older_than
+    stale = []
+    try:
+        for entry in os.scandir(upload_dir):
+            if entry.is_file() and entry.name.startswith("upload-") and os.path.abspath(entry.path) not in keep \
+                    and entry.stat().st_mtime < cutoff:
+                stale.append(entry.path)
+    except FileNotFoundError:
+        return 0
+    remove_uploads(stale)
+    if stale:
+        logger.info(f"Removed {len(stale)} stale uploads from {upload_dir}")
+    return len(stale)
@@ -0,0 +1,74 @@
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future
+from backend.cache import TTLCache
+from backend import metrics
+from typing import Dict
+import requests
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WeatherClient:
+    def __init__(self, api_key: str, base_url: str = "http://api.openweathermap.org/data/2.5/weather", timeout: float = 3.0,
+                 ttl_seconds: float = 600, negative_ttl_seconds: float = 60, cache_size: int = 1024, pool_size: int = 10):
+        """OpenWeatherMap client with a pooled session, per-location TTL cache and request coalescing."""
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # Keep-alive connections shared by every query thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache = TTLCache(cache_size, ttl_seconds)
+        self.upstream_calls = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, location: str) -> Dict:
+        try:
+            with self._lock:
+                self.upstream_calls += 1
+            response = self.session.get(
+                self.base_url,
+                params={"q": location, "appid": self.api_key, "units": "metric"},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error fetching weather data: {str(e)}")
+            return {"error": "Unable to fetch weather data"}
+
+    def get(self, location: str) -> Dict:
+        """Return weather for a location; concurrent callers for the same location share one upstream call."""
+        key = location.strip().casefold()
+        with self._lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.record_cache("weather", True)
+                return cached
+            future = self._inflight.get(key)
+            leader = future is None
+            # Callers joining an in-flight request don't cost an upstream call either
+            metrics.record_cache("weather", not leader)
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._fetch(location)
+            # Failures are cached briefly so an outage doesn't turn into a retry storm
+            self.cache.put(key, result, self.negative_ttl_seconds if "error" in result else None)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
@@ -0,0 +1,98 @@
+"""Closed-loop load test against a running AgroDoc API.
+
+Each of --concurrency client threads sends /query requests back to back for
+--duration seconds, so throughput, tail latency and the share of requests shed
+by admission control (503) can be compared across worker/thread settings.
+
+    python -m backend.serve --workers 4 --threads 16
+    python -m benchmarks.bench_load --url http://localhost:5000 --concurrency 32 --duration 60
+"""
+from typing import Dict, List
+import collections
+import threading
+import argparse
+import itertools
+import json
+import time
+
+import requests
+
+from benchmarks.bench_rag import QUERIES, percentiles
+
+def run_load(url: str, concurrency: int, duration: float, location: str = None, target_lang: str = "en",
+             timeout: float = 60.0) -> Dict:
+    """Drive /query from concurrency threads for duration seconds and summarize the responses."""
+    queries = itertools.cycle(QUERIES)
+    queries_lock = threading.Lock()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    rejected_latencies: List[float] = []
+    statuses = collections.Counter()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            with queries_lock:
+                query = next(queries)
+            start = time.perf_counter()
+            try:
+                response = session.post(
+                    f"{url}/query",
+                    json={"query": query, "location": location, "target_lang": target_lang},
+                    timeout=timeout
+                )
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] += 1
+                (rejected_latencies if status == "503" else latencies).append(elapsed)
+            if status == "503":
+                # Honour the server's back-off a little so shed load doesn't spin
+                time.sleep(0.05)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    total = sum(statuses.values())
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "duration_s": wall,
+        "requests": total,
+        "throughput_rps": statuses["200"] / wall if wall else 0.0,
+        "status_counts": dict(statuses),
+        "rejected_rate": statuses["503"] / total if total else 0.0,
+        "latency": percentiles(latencies),
+        "rejected_latency": percentiles(rejected_latencies)
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Closed-loop load test of the AgroDoc /query endpoint.")
+    parser.add_argument("--url", default="http://localhost:5000", help="base URL of the API")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads sending requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--location", default="", help="location sent with each query ('' for none)")
+    parser.add_argument("--target-lang", default="en")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = run_load(args.url.rstrip("/"), args.concurrency, args.duration, args.location or None,
+                       args.target_lang, args.timeout)
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
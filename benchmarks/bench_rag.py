@@ -0,0 +1,252 @@
+"""Offline benchmark for the AgroDoc RAG pipeline.
+
+Runs ingest and the query path against deterministic local stand-ins for the
+Groq LLM, OpenWeatherMap and the translation provider, so timings reflect local
+work (PDF parsing, embedding, ChromaDB, caching, orchestration) rather than
+network noise. The embedding model is the real one from config/config.yaml.
+
+    python -m benchmarks.bench_rag --output bench_results.json
+"""
+from types import SimpleNamespace
+from pathlib import Path
+from typing import Dict, Iterator, List
+import argparse
+import hashlib
+import resource
+import logging
+import tempfile
+import shutil
+import json
+import time
+import sys
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PDF = os.path.join(REPO_ROOT, "data", "raw", "02-Agriculture.pdf")
+
+QUERIES = [
+    "How to improve wheat yield?",
+    "When should I sow cotton in Punjab?",
+    "What is the best fertilizer for rice paddies?",
+    "How do I control pink bollworm in cotton?",
+    "How much water does sugarcane need?",
+    "Which wheat varieties resist rust disease?",
+    "How can drip irrigation save water for maize?",
+    "What are the signs of nitrogen deficiency in crops?",
+    "How to store grain safely after harvest?",
+    "What is the recommended seed rate for wheat per acre?",
+    "How to manage weeds in rice without chemicals?",
+    "When is the right time to harvest sugarcane?"
+]
+
+class FakeLLM:
+    def __init__(self, latency: float = 0.0, tokens_per_chunk: int = 4):
+        """Stand-in for groq.Groq that returns a deterministic answer per prompt."""
+        self.latency = latency
+        self.tokens_per_chunk = tokens_per_chunk
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _answer(self, prompt: str) -> str:
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        sentences = [
+            "Prepare the field with a fine seedbed before sowing.",
+            "Apply nitrogen in split doses to reduce losses.",
+            "Irrigate at the critical growth stages and avoid waterlogging.",
+            "Scout weekly for pests and act when the threshold is crossed.",
+            "Use certified seed of a recommended variety for your area.",
+            "Harvest at physiological maturity to limit grain losses."
+        ]
+        return " ".join(sentences[(seed >> (4 * i)) % len(sentences)] for i in range(5))
+
+    def _stream(self, answer: str) -> Iterator:
+        words = answer.split(" ")
+        for i in range(0, len(words), self.tokens_per_chunk):
+            text = " ".join(words[i:i + self.tokens_per_chunk]) + " "
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    def create(self, model: str, messages: List[Dict], max_tokens: int = 500, stream: bool = False, timeout: float = None):
+        if self.latency:
+            time.sleep(self.latency)
+        answer = self._answer(messages[-1]["content"])
+        if stream:
+            return self._stream(answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+class FakeWeatherClient:
+    def __init__(self, latency: float = 0.0):
+        """Stand-in for WeatherClient returning fixed conditions."""
+        self.latency = latency
+
+    def get(self, location: str) -> Dict:
+        if self.latency:
+            time.sleep(self.latency)
+        return {"weather": [{"description": "clear sky"}], "main": {"temp": 31.0}}
+
+def percentiles(samples: List[float]) -> Dict:
+    """Nearest-rank p50/p95/p99 plus mean, in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))] * 1000
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "max_ms": ordered[-1] * 1000
+    }
+
+def max_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+def pool_max_rss_mb() -> List[float]:
+    """Peak resident set size of each live PDF extraction worker (read from /proc, so Linux only).
+
+    The workers are forkserver children, not children of this process, so
+    RUSAGE_SELF and RUSAGE_CHILDREN never include them.
+    """
+    from backend import preprocess
+    pool = preprocess._pdf_pool
+    peaks = []
+    for pid in list(pool._processes or {}) if pool else []:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                peaks.extend(int(line.split()[1]) / 1024 for line in f if line.startswith("VmHWM:"))
+        except OSError:
+            pass
+    return peaks
+
+def timed(samples: Dict[str, List[float]], stage: str, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.setdefault(stage, []).append(time.perf_counter() - start)
+    return result
+
+def run_benchmark(pdf_path: str, iterations: int, llm_latency: float, weather_latency: float,
+                  translate_latency: float, location: str, target_lang: str) -> Dict:
+    from backend.rag import AgroDocRAG
+    from backend.ingest import ingest_documents
+    from backend.embeddings import get_embedding_engine
+    from backend.translation import StubBackend, TranslationMemory, TranslationService
+
+    results = {"config": {
+        "pdf": os.path.basename(pdf_path),
+        "iterations": iterations,
+        "queries": len(QUERIES),
+        "llm_latency_s": llm_latency,
+        "weather_latency_s": weather_latency,
+        "translate_latency_s": translate_latency,
+        "location": location,
+        "target_lang": target_lang
+    }}
+
+    start = time.perf_counter()
+    engine = get_embedding_engine()
+    engine.load()
+    results["startup"] = {"embedding_model_load_s": time.perf_counter() - start}
+
+    translator = TranslationService(
+        StubBackend(delay=translate_latency),
+        TranslationMemory(os.path.join("data", "processed", "translation_memory.sqlite3"))
+    )
+    rag = AgroDocRAG(groq_client=FakeLLM(llm_latency), weather_client=FakeWeatherClient(weather_latency), translator=translator)
+    results["memory_mb"] = {"after_startup": max_rss_mb()}
+
+    # Ingest into an empty store so every chunk is parsed, embedded and written
+    stats = ingest_documents([Path(pdf_path)], [{"source": os.path.basename(pdf_path)}], rag)
+    results["ingest"] = {
+        "pages": stats["pages"],
+        "chunks": stats["chunks"],
+        "seconds": stats["seconds"],
+        "pages_per_second": stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0,
+        "chunks_per_second": stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    }
+    results["memory_mb"]["after_ingest"] = max_rss_mb()
+    # With ingest.workers > 1, pages are extracted in a process pool that max_rss_mb() does not see
+    worker_peaks = pool_max_rss_mb()
+    results["memory_mb"]["ingest_workers"] = {
+        "processes": len(worker_peaks),
+        "max_per_process": max(worker_peaks, default=0.0),
+        "sum": sum(worker_peaks),
+        "note": "peak RSS of the PDF extraction pool processes, measured separately from after_ingest; "
+                "sum counts pages shared between them once per process" if worker_peaks else
+                "no extraction pool processes were measured (ingest.workers is 1 or /proc is unavailable)"
+    }
+
+    # Individual stages, bypassing the caches so each call does the real work
+    uncached_translator = TranslationService(StubBackend(delay=translate_latency))
+    samples = {}
+    for _ in range(iterations):
+        for query in QUERIES:
+            embedding = timed(samples, "embed", engine.encode, [query])[0]
+            documents = timed(samples, "retrieve", rag.collection.query, query_embeddings=[embedding], n_results=5)
+            context = [{"text": text, "metadata": meta} for text, meta in zip(documents["documents"][0], documents["metadatas"][0])]
+            answer = timed(samples, "llm", rag.generate_answer, query, context, cache=False)
+            timed(samples, "translate", uncached_translator.translate, answer, target_lang, submit=rag._submit)
+
+    # Full request path with cold answer and query-embedding caches
+    for _ in range(iterations):
+        for query in QUERIES:
+            rag.answer_cache.invalidate()
+            rag.query_embedding_cache.clear()
+            result = timed(samples, "end_to_end", rag.process_query, query, location, target_lang)
+            if "error" in result:
+                raise RuntimeError(f"Query failed during benchmark: {result['error']}")
+
+    # Repeated traffic served from the answer cache; answers with a location are never cached,
+    # so fill the cache with one untimed pass of the same location-free queries first
+    for query in QUERIES:
+        rag.process_query(query, None, target_lang)
+    for _ in range(iterations):
+        for query in QUERIES:
+            timed(samples, "end_to_end_cached", rag.process_query, query, None, target_lang)
+
+    results["query_latency"] = {stage: percentiles(values) for stage, values in samples.items()}
+    results["memory_mb"]["after_queries"] = max_rss_mb()
+    results["embedding_engine"] = engine.stats()
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the AgroDoc RAG pipeline with local stand-ins.")
+    parser.add_argument("--pdf", default=DEFAULT_PDF, help="PDF to ingest (default: data/raw/02-Agriculture.pdf)")
+    parser.add_argument("--iterations", type=int, default=3, help="passes over the query set per measurement")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated LLM latency in seconds")
+    parser.add_argument("--weather-latency", type=float, default=0.0, help="simulated weather API latency in seconds")
+    parser.add_argument("--translate-latency", type=float, default=0.0, help="simulated translation latency per request")
+    parser.add_argument("--location", default="Lahore", help="location sent with end-to-end queries ('' for none)")
+    parser.add_argument("--target-lang", default="ur")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the scratch data directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    pdf_path = os.path.abspath(args.pdf)
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Work in a scratch directory so data/processed in the repo is never touched
+    sys.path.insert(0, REPO_ROOT)
+    workdir = tempfile.mkdtemp(prefix="agrodoc-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        results = run_benchmark(pdf_path, args.iterations, args.llm_latency, args.weather_latency,
+                                args.translate_latency, args.location or None, args.target_lang)
+    finally:
+        os.chdir(cwd)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+import json
+import time
 import os
 import logging
 
@@ -10,6 +12,16 @@ logger = logging.getLogger(__name__)
 # Backend API URL
 BACKEND_URL = os.getenv("BACKEND_URL", "https://IsrarHussain-farmer-app.hf.space")
 
+def iter_events(response):
+    """Yield (event, data) pairs from a server-sent events response."""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+            event = "message"
+
 st.title("AgroDoc: Smart Farmer Assistant")
 st.markdown("Ask crop, soil, or weather-related questions and get advice in English or Urdu.")
 
@@ -23,36 +35,37 @@ if st.button("Get Answer"):
     if query:
         target_lang = "ur" if language == "Urdu" else "en"
         try:
-            # Send query to backend API
+            # Stream the answer from the backend so the first words show up quickly
             response = requests.post(
-                f"{BACKEND_URL}/query",
-                json={"query": query, "location": location, "target_lang": target_lang}
+                f"{BACKEND_URL}/query/stream",
+                json={"query": query, "location": location, "target_lang": target_lang},
+                stream=True
             )
             response.raise_for_status()
-            result = response.json()
-            
-            if "error" not in result:
-                # Show answer based on selected language
-                if language == "English":
-                    st.subheader("Answer")
-                    st.write(result["answer"])
-                    
-                    # Only show sources if available
-                    if "context" in result and result["context"]:
-                        st.subheader("Sources Used")
-                        for ctx in result["context"]:
-                            st.write(f"- {ctx['text']} (Source: {ctx['metadata'].get('source', 'unknown')})")
-                else:  # Urdu
-                    st.subheader("جواب")
-                    st.write(result["translated_answer"])
-                    
-                    # Only show sources if available
-                    if "context" in result and result["context"]:
-                        st.subheader("استعمال شدہ ذرائع")
-                        for ctx in result["context"]:
-                            st.write(f"- {ctx['text']} (Source: {ctx['metadata'].get('source', 'unknown')})")
-            else:
-                st.error(f"Error: {result['error']}")
+
+            st.subheader("Answer" if language == "English" else "جواب")
+            answer_placeholder = st.empty()
+            shown_text = ""
+            context = []
+            for event, data in iter_events(response):
+                if event == "context":
+                    context = data["context"]
+                elif event == "token" and language == "English":
+                    shown_text += data["text"]
+                    answer_placeholder.markdown(shown_text)
+                elif event == "sentence" and language != "English":
+                    # Keep the answer's line breaks so lists render as they do for /query
+                    separator = "\n" * data.get("breaks", 0) or (" " if shown_text else "")
+                    shown_text += separator + data["translated"]
+                    answer_placeholder.markdown(shown_text)
+                elif event == "error":
+                    st.error(f"Error: {data['error']}")
+
+            # Only show sources if available
+            if context:
+                st.subheader("Sources Used" if language == "English" else "استعمال شدہ ذرائع")
+                for ctx in context:
+                    st.write(f"- {ctx['text']} (Source: {ctx['metadata'].get('source', 'unknown')})")
         except requests.RequestException as e:
             st.error(f"Failed to connect to backend: {str(e)}")
     else:
@@ -60,47 +73,53 @@ if st.button("Get Answer"):
 
 # Document upload section
 st.header("Upload Agricultural Documents")
-uploaded_file = st.file_uploader("Upload a document (PDF or text):", type=["txt", "pdf"])
+uploaded_files = st.file_uploader("Upload documents (PDF or text):", type=["txt", "pdf"], accept_multiple_files=True)
 
-if uploaded_file is not None:
+if uploaded_files:
     try:
-        # Process based on file type
-        file_type = uploaded_file.name.split('.')[-1].lower()
-        
-        if file_type == 'txt':
-            # For text files, decode and display preview
-            document = uploaded_file.read().decode("utf-8")
-            st.write("**Uploaded Document Preview:**")
-            st.write(document[:500] + "..." if len(document) > 500 else document)
-            document_content = document
-        elif file_type == 'pdf':
-            # For PDF files, just show confirmation
-            document_content = uploaded_file.read()
-            st.write(f"**PDF Uploaded:** {uploaded_file.name}")
-            st.info("PDF content will be processed by the backend.")
-        
-        if st.button("Ingest Document"):
+        st.write("**Uploaded Documents:**")
+        for uploaded_file in uploaded_files:
+            st.write(f"- {uploaded_file.name} ({uploaded_file.size / 1024:.0f} KB)")
+            if uploaded_file.name.lower().endswith('.txt'):
+                # For text files, display a preview
+                preview = uploaded_file.getvalue()[:500].decode("utf-8", errors="replace")
+                st.write(preview + "..." if uploaded_file.size > 500 else preview)
+
+        if st.button("Ingest Documents"):
             try:
-                # Send document to backend /ingest endpoint
-                if file_type == 'txt':
-                    # For text files, send as string
-                    payload = {"documents": [document_content], "metadata": [{"source": uploaded_file.name}]}
-                else:
-                    # For PDFs, encode as base64 string
-                    import base64
-                    encoded_pdf = base64.b64encode(document_content).decode('utf-8')
-                    payload = {"documents": [encoded_pdf], "metadata": [{"source": uploaded_file.name, "type": "pdf"}]}
-                
+                # Send the files as multipart form data; the backend streams them to disk
+                # instead of receiving base64 inside a JSON body
+                for uploaded_file in uploaded_files:
+                    uploaded_file.seek(0)
+                files = [
+                    ("files", (uploaded_file.name, uploaded_file, uploaded_file.type or "application/octet-stream"))
+                    for uploaded_file in uploaded_files
+                ]
                 response = requests.post(
                     f"{BACKEND_URL}/ingest",
-                    json=payload
+                    files=files
                 )
                 response.raise_for_status()
                 result = response.json()
-                if "error" not in result:
-                    st.success(result["message"])
-                else:
+                if "error" in result:
                     st.error(f"Error: {result['error']}")
+                else:
+                    # Ingestion runs as a background job; poll until it finishes
+                    st.info(result["message"])
+                    progress = st.empty()
+                    status = result
+                    while status.get("status") in ("queued", "running"):
+                        time.sleep(1)
+                        status_response = requests.get(f"{BACKEND_URL}/ingest/{result['job_id']}")
+                        status = status_response.json()
+                        if status_response.status_code != 200 or "error" in status:
+                            st.error(f"Error checking ingest progress: {status.get('error', status_response.status_code)}")
+                            break
+                        progress.write(f"Status: {status.get('status')} - {status.get('chunks_done', 0)} chunks processed")
+                    if status.get("status") == "done":
+                        st.success(f"Ingested {status['chunks_done']} document chunks ({status['chunks_stored']} new)")
+                    for error in status.get("errors", []):
+                        st.error(f"Error: {error}")
             except requests.RequestException as e:
                 st.error(f"Failed to ingest document: {str(e)}")
     except Exception as e: